@@ -154,15 +154,90 @@ USE_TZ = True
 STATIC_URL = '/static/'
 
 CACHES = {
+    # Cache shared by all worker processes, stored on local disk
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'helpers.cache_backends.SQLiteCache',
+        'LOCATION': os.path.join(BASE_DIR, 'StockBot-cache.sqlite3'),
         'TIMEOUT': 86400,
         'OPTIONS': {
             'MAX_ENTRIES': 10000
         }
+    },
+    # Small in-process cache in front of the shared cache.
+    # Entries are kept for at most TIMEOUT seconds, so that changes from other processes are seen quickly.
+    'local': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'local',
+        'TIMEOUT': 60,
+        'OPTIONS': {
+            'MAX_ENTRIES': 1000
+        }
     }
 }
 
+# Maximum number of seconds clients may reuse a chart from /quotes/view for before revalidating it.
+# Charts are never reused past the end of the current trading interval, or past the next market open.
+CHART_VIEW_MAX_AGE = 3600
+
+# Directory of rendered chart images, shared by all worker processes
+CHART_STORE_DIR = os.path.join(BASE_DIR, 'chart-images')
+# Number of seconds to keep rendered chart images for
+CHART_STORE_MAX_AGE = 86400 * 4
+# Header used to have the web server send chart images: 'X-Accel-Redirect' for nginx,
+# 'X-Sendfile' for Apache or lighttpd, or None to send them from Django.
+# See documentation/SETUP_NOTES.md for the nginx configuration.
+CHART_STORE_SENDFILE = None
+# Internal nginx location serving CHART_STORE_DIR, when using X-Accel-Redirect
+CHART_STORE_URL = '/chart-images/'
+
+# Keep test runs isolated from each other
+if 'test' in sys.argv:
+    CACHES['default'] = {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'shared',
+        'TIMEOUT': 86400
+    }
+    import atexit, shutil, tempfile
+    CHART_STORE_DIR = tempfile.mkdtemp(prefix='StockBot-chart-images-')
+    atexit.register(shutil.rmtree, CHART_STORE_DIR, True)
+
+# Pooled HTTP connections to Robinhood, kept per worker process.
+# ROBINHOOD_POOL_CONNECTIONS is the number of hosts to keep connection pools for,
+# and ROBINHOOD_POOL_MAXSIZE is the maximum number of connections kept open to a single host.
+ROBINHOOD_POOL_CONNECTIONS = 4
+ROBINHOOD_POOL_MAXSIZE = 16
+# Wait for a free connection when a host's pool is exhausted, instead of opening an unpooled one
+ROBINHOOD_POOL_BLOCK = True
+# Timeouts (in seconds) for connecting to and reading responses from Robinhood
+ROBINHOOD_CONNECT_TIMEOUT = 3.05
+ROBINHOOD_READ_TIMEOUT = 15
+
+# Shared thread pool used for concurrent Robinhood requests and background work, one per worker process.
+# When the queue is full, new tasks run in the calling thread instead.
+EXECUTOR_MAX_WORKERS = 16
+EXECUTOR_MAX_QUEUE_SIZE = 256
+# Maximum number of seconds to wait on the result of a task
+EXECUTOR_TASK_TIMEOUT = 60
+
+# Number of seconds a rendered chart is reused for while the market is open.
+# While the market is closed, charts are reused until it next opens.
+CHART_TRADING_INTERVAL = 60
+# Number of seconds to wait for a chart to render before replying to a Mattermost command.
+# Slower charts keep rendering in the background, and are served once Mattermost requests the image.
+CHART_RENDER_WAIT = 2
+
+# Number of separate processes to render charts in, per worker process.
+# When 0, charts are rendered in the worker process itself.
+CHART_RENDER_PROCESSES = 0
+# Maximum number of charts waiting on the render processes; further charts are rendered in the worker process
+CHART_RENDER_MAX_QUEUE_SIZE = 32
+# Maximum number of seconds to wait on a render process
+CHART_RENDER_TIMEOUT = 30
+
+# Whether to warm up each new worker process in the background, rendering a chart and looking up
+# the market's hours before the first request needs them. The time taken is logged.
+WORKER_WARM_UP = True
+
 APPEND_SLASH = True
 
 USE_HTTPS_FOR_URLS = False
@@ -0,0 +1,117 @@
+"""Benchmark for constructing API model objects from Robinhood response data.
+
+Compares the precompiled per-class decoders used by ApiModel against the previous
+attribute-by-attribute decoding path, using a typical 5-minute historicals payload.
+
+Run from the project root:
+    python -m benchmarks.model_construction [--items N] [--repeat N]
+"""
+import argparse
+import os
+import sys
+import timeit
+import tracemalloc
+from datetime import date, datetime, timedelta
+
+import pytz
+from dateutil import parser as dateparser
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'StockBot.settings')
+
+from robinhood.models import HistoricalItem, Stock
+
+
+class LegacyHistoricalItem():
+    """Reference implementation of the previous ApiModel decoding path."""
+    attributes = HistoricalItem.attributes
+
+    def __init__(self, **data):
+        self.data = data
+        for attr in self.attributes:
+            if attr in data:
+                setattr(self, attr, self.typed_attribute(attr, data[attr]))
+            else:
+                setattr(self, attr, None)
+
+    def typed_attribute(self, attr, val):
+        if val == None:
+            return val
+        attr_type = self.attributes[attr]
+        if attr_type == None:
+            return val
+        elif attr_type == date:
+            if type(val) is str:
+                val = dateparser.parse(val).date()
+            elif type(val) is datetime:
+                val = val.date()
+            return val
+        elif attr_type == datetime:
+            if type(val) in [int, float]:
+                val = datetime.fromtimestamp(val)
+            elif type(val) is str:
+                val = dateparser.parse(val).astimezone(pytz.utc).replace(tzinfo=None)
+            return val
+        elif attr_type == bool:
+            return val in [True, 'true', 'True', 't', 1]
+        else:
+            return attr_type(val)
+
+
+def historicals_payload(num_items):
+    start = datetime(2024, 1, 2, 14, 30)
+    return [{
+        'begins_at': (start + timedelta(minutes=5 * i)).strftime('%Y-%m-%dT%H:%M:%SZ'),
+        'open_price': '{:.4f}'.format(100 + i * 0.01),
+        'close_price': '{:.4f}'.format(100 + i * 0.02),
+        'high_price': '{:.4f}'.format(100 + i * 0.03),
+        'low_price': '{:.4f}'.format(100 - i * 0.01),
+        'volume': 1000 + i,
+        'session': 'reg',
+        'interpolated': False
+    } for i in range(num_items)]
+
+
+def construction_time(item_class, payload, repeat):
+    timer = timeit.Timer(lambda: [item_class(**item) for item in payload])
+    return min(timer.repeat(repeat=repeat, number=1))
+
+
+def memory_per_object(item_class, payload):
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    items = [item_class(**item) for item in payload]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    # Includes the copy of the raw data dict that each object keeps
+    allocated = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    return allocated / len(items)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument('--items', type=int, default=2000, help="Number of historical items per run")
+    arg_parser.add_argument('--repeat', type=int, default=5, help="Number of runs; the fastest run is reported")
+    args = arg_parser.parse_args()
+
+    payload = historicals_payload(args.items)
+
+    # Verify that both paths decode the same values before timing them
+    for legacy, current in zip([LegacyHistoricalItem(**i) for i in payload[:10]], [HistoricalItem(**i) for i in payload[:10]]):
+        for attr in HistoricalItem.attributes:
+            assert getattr(legacy, attr) == getattr(current, attr), attr
+
+    legacy_time = construction_time(LegacyHistoricalItem, payload, args.repeat)
+    current_time = construction_time(Stock.Historicals.Item, payload, args.repeat)
+    legacy_memory = memory_per_object(LegacyHistoricalItem, payload)
+    current_memory = memory_per_object(Stock.Historicals.Item, payload)
+
+    print("Constructing {} historical items (best of {} runs)".format(args.items, args.repeat))
+    print("{:<24}{:>12}{:>16}".format('', 'time (ms)', 'bytes/object'))
+    print("{:<24}{:>12.2f}{:>16.0f}".format('legacy decoding', legacy_time * 1000, legacy_memory))
+    print("{:<24}{:>12.2f}{:>16.0f}".format('compiled decoders', current_time * 1000, current_memory))
+    print("Speedup: {:.1f}x".format(legacy_time / current_time))
+
+
+if __name__ == '__main__':
+    main()
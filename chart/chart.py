@@ -1,22 +1,35 @@
 import matplotlib
 from matplotlib import axes, figure
-matplotlib.use('agg')
-import matplotlib.pyplot as plt
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 import matplotlib.dates as mdates
 from matplotlib.ticker import FuncFormatter
+import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta
 from io import BytesIO
 from enum import Enum
 from chart.chart_data import ChartData
+from chart.downsample import lttb
+from chart.layers import LayerCache
 
 # Needed to register a datetime converter
 from pandas.plotting import register_matplotlib_converters
 register_matplotlib_converters()
 
 class Chart():
+    """Chart of one or more data sets.
+
+    Each chart has its own figure drawn on its own Agg canvas, without using pyplot and its global
+    figure manager. This makes it safe to render multiple charts in parallel threads, and figures
+    are released like any other object once the chart is no longer referenced.
+    """
     # Size of the overall chart
     size = (7, 3)
+    dpi = 100
+
+    # Maximum number of points to plot for each line. Lines with more points are downsampled.
+    # By default, this is one point per pixel of the chart's width.
+    max_points_per_line = size[0] * dpi
 
     # Color for all general chart text
     TEXT_COLOR = 'grey'
@@ -90,6 +103,11 @@ class Chart():
     # Additional spacing at top to accommodate title, price, etc.
     top_spacing = 0.8
 
+    # Pre-rendered backgrounds, shared by all charts in this process.
+    # A background contains the parts of a chart that depend only on its size and time range:
+    # the time axis with its labels and grid lines, and the chart's frame.
+    backgrounds = LayerCache()
+
     def __init__(self, title, span, market_timezone, market_hours, hide_value = False):
         self.market_timezone = market_timezone
         self.market_hours = market_hours
@@ -102,7 +120,9 @@ class Chart():
 
         self.figure: figure.Figure
         self.axis: axes.Axes
-        self.figure, self.axis = plt.subplots(1, figsize=self.size)
+        self.figure = figure.Figure(figsize=self.size, dpi=self.dpi)
+        FigureCanvasAgg(self.figure)
+        self.axis = self.figure.subplots(1)
 
         self.axis.tick_params(colors=Chart.TEXT_COLOR)
 
@@ -119,7 +139,10 @@ class Chart():
         self.figure.subplots_adjust(top=self.top_spacing)
 
         self.axis.set_xlim(right=self.end_time)
-        self.__set_time_format()
+        self.__set_time_format(self.axis)
+        if self.__is_day_chart():
+            self.__show_day_chart_options()
+        self.background_shown = False
 
         if self.hide_value:
             self.axis.yaxis.set_major_formatter(FuncFormatter(self.__percent))
@@ -163,11 +186,13 @@ class Chart():
             if timedelta(days=1) < self.span < timedelta(weeks=12):
                 series = self.__normalize_indices(series)
 
+            # Points closer together than a pixel cannot be seen, but still cost time to render
+            series = self.__downsample(series)
+
             if self.hide_value:
                 # Do not show the actual dollar values. Only show as percentages.
                 if reference_price != 0:
-                    for t in series.index:
-                        series.at[t] = series.at[t] / reference_price
+                    series = series / reference_price
                     current_price /= reference_price
                 
                 reference_price = 1.0
@@ -286,9 +311,10 @@ class Chart():
 
 
     def get_img_data(self):
+        if not self.background_shown:
+            self.__show_background()
         figure_img_data = BytesIO()
-        self.figure.savefig(figure_img_data, format='png', dpi=(100), transparent=True)
-        plt.close(self.figure)
+        self.figure.savefig(figure_img_data, format='png', dpi=self.dpi, transparent=True)
 
         return figure_img_data.getvalue()
 
@@ -299,15 +325,18 @@ class Chart():
     def __percent(self, y, pos):
         return '{}%'.format(round((y - 1) * 100, 2))
 
+    def __downsample(self, series):
+        if len(series) <= self.max_points_per_line:
+            return series
+        times = series.index.values.astype('datetime64[us]').view(np.int64)
+        return series.iloc[lttb(times, series.values, self.max_points_per_line)]
+
     def __normalize_indices(self, series):
-        new_index = []
-        new_date = series.index[0]
+        # Spread the data points evenly across the time range
         time_diff = (series.index[-1] - series.index[0]).total_seconds()
         spread_factor = time_diff / len(series.index)
-        for n in range(0, len(series.index)):
-            new_date += timedelta(seconds=spread_factor)
-            new_index.append(new_date)
-        return pd.Series(series.values, index=new_index)
+        offsets = pd.to_timedelta(np.arange(1, len(series.index) + 1) * spread_factor, unit='s')
+        return pd.Series(series.values, index=series.index[0] + offsets)
 
     def __show_title(self, title):
         if len(title) > self.max_title_length:
@@ -336,7 +365,7 @@ class Chart():
             else:
                 self.current_price_str = '${:,.2f}'.format(current_price)
             self.axis.text(self.current_price_xpos, self.price_info_height, self.current_price_str,
-                transform=plt.gcf().transFigure,
+                transform=self.figure.transFigure,
                 fontsize=self.current_price_fontsize)
 
         # Show the latest price/change on the graph
@@ -360,15 +389,53 @@ class Chart():
             price_change_str += "{}{} ".format(change_sign, point_change)
         price_change_str += "({}%)".format(percentage_change)
         self.axis.text(self.price_change_xpos, self.price_info_height, price_change_str,
-            transform=plt.gcf().transFigure,
+            transform=self.figure.transFigure,
             color = market_color.value,
             fontsize=self.price_change_fontsize)
 
+    def __show_background(self):
+        # The time range is final once all data has been plotted
+        xlim = self.axis.get_xlim()
+        key = (self.size, self.span, str(self.market_timezone), xlim)
+        image, x_offset, y_offset = Chart.backgrounds.get(key, lambda: self.__render_background(xlim))
+        self.figure.figimage(image, x_offset, y_offset, zorder=-1)
+
+        # Draw everything else over the background
+        self.axis.xaxis.set_visible(False)
+        for spine in self.axis.spines.values():
+            spine.set_visible(False)
+        self.background_shown = True
+
+    def __render_background(self, xlim):
+        # Draw the background on an empty chart with the same layout as this one
+        background = figure.Figure(figsize=self.size, dpi=self.dpi)
+        FigureCanvasAgg(background)
+        background.patch.set_visible(False)
+        axis = background.subplots(1)
+        background.subplots_adjust(top=self.top_spacing)
+        axis.patch.set_visible(False)
+        axis.tick_params(colors=Chart.TEXT_COLOR)
+        axis.xaxis_date(self.market_timezone)
+        axis.grid(self.show_grid, axis='x', **self.grid_style)
+        self.__set_time_format(axis)
+        axis.set_xlim(xlim)
+        axis.yaxis.set_visible(False)
+        background.canvas.draw()
+
+        # Keep only the area that has been drawn on
+        image = np.asarray(background.canvas.buffer_rgba())
+        rows = np.flatnonzero(image[:, :, 3].any(axis=1))
+        columns = np.flatnonzero(image[:, :, 3].any(axis=0))
+        image = image[rows[0]:rows[-1] + 1, columns[0]:columns[-1] + 1].copy()
+        # Backgrounds are shared between charts, make sure none of them can modify one
+        image.flags.writeable = False
+        # Offsets are measured from the bottom left of the chart
+        return image, int(columns[0]), int(background.canvas.get_width_height()[1] - rows[-1] - 1)
+
     # Format chart depending on time span
-    def __set_time_format(self):
+    def __set_time_format(self, axis):
         if self.__is_day_chart():
             time_format = self.hourly_format
-            self.__show_day_chart_options()
         elif self.span <= timedelta(days=120):
             time_format = self.daily_format
         elif self.span <= timedelta(days=365*3):
@@ -381,9 +448,9 @@ class Chart():
             while year >= (self.end_time - self.span).year:
                 year_ticks.insert(0, pd.Timestamp(year=year, month=1, day=1, tz=self.market_timezone))
                 year -= 1
-            self.axis.set_xticks(year_ticks)
+            axis.set_xticks(year_ticks)
 
-        self.axis.xaxis.set_major_formatter(
+        axis.xaxis.set_major_formatter(
             mdates.DateFormatter(time_format, self.market_timezone)
         )
 
@@ -408,7 +475,7 @@ class Chart():
         info_str = span_str + "\n" + date_str
 
         self.axis.text(self.chart_time_pos[0], self.chart_time_pos[1], info_str,
-            transform=plt.gcf().transFigure,
+            transform=self.figure.transFigure,
             color = 'grey',
             fontsize=10)
 
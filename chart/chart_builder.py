@@ -4,22 +4,35 @@ import re
 from django.db import connection
 from chart.chart import Chart
 from chart.chart_data import ChartData
+from chart.render_pool import ChartSpec, render_pool
 from helpers.utilities import str_to_duration
 from indexes.models import Asset, Index
 
 from quotes.aggregator import Aggregator
 from exceptions import BadRequestException
-from robinhood.models import Market
+from robinhood.models import Instrument, Market
+from helpers.pool import executor
 
 MARKET = 'XNYS'
 
 DATABASE_PRESENT = bool(connection.settings_dict['NAME'])
 
-def build_chart(identifiers, span = 'day', split=False):
+def build_chart(identifiers, span = 'day', split=False) -> Chart:
+    return prepare_chart(identifiers, span, split).create_chart()
+
+def build_chart_img(identifiers, span = 'day', split=False) -> bytes:
+    """bytes: PNG data of the chart, rendered by the render process pool if it is enabled."""
+    return render_pool.render(prepare_chart(identifiers, span, split))
+
+def prepare_chart(identifiers, span = 'day', split=False) -> ChartSpec:
     span = str_to_duration(span)
 
+    # Market hours are only needed to determine the time range of the chart,
+    # so they are looked up while instruments and their market data are being retrieved
+    market_hours_task = executor.submit(get_market_hours)
+
     aggregator = Aggregator()
-    indexes, title = get_indexes_and_title(aggregator, identifiers)
+    indexes, title = get_indexes_and_title(aggregator, identifiers, get_historical_params(span))
 
     # Hide the pricing information for a user index
     hide_value = any([p.pk for p in indexes])
@@ -36,24 +49,34 @@ def build_chart(identifiers, span = 'day', split=False):
     # Show the price only when quoting a single asset not from a user index
     show_price = len(chart_data_sets) == 1 and not indexes[0].pk
 
-    market = Market.get(MARKET)
-    market_hours = market.hours()
-    if not (market_hours.is_open and datetime.now() >= market_hours.extended_opens_at):
-        # Get the most recent open market hours, and change the start/end time accordingly
-        market_hours = market_hours.previous_open_hours()
+    market, market_hours = market_hours_task.get()
 
     start_time, end_time = get_start_and_end_time(market_hours, span)
 
+    # Already loaded along with the instruments
     quotes, historicals = aggregator.quotes_and_historicals(start_time, end_time)
 
     for chart_data in chart_data_sets:
         chart_data.load(quotes, historicals, start_time, end_time)
 
-    chart = Chart(title, span, market.timezone, market_hours, hide_value)
-    chart.plot(*chart_data_sets, show_price=show_price)
-    return chart
+    return ChartSpec(title, span, market.timezone, market_hours, hide_value, chart_data_sets, show_price)
+
+def get_market_hours():
+    market = Market.get(MARKET)
+    market_hours = market.hours()
+    if not (market_hours.is_open and datetime.now() >= market_hours.extended_opens_at):
+        # Get the most recent open market hours, and change the start/end time accordingly
+        market_hours = market_hours.previous_open_hours()
+    return market, market_hours
+
+def get_historical_params(span) -> dict:
+    """dict: Parameters for the historicals of a chart over the given span.
+    Charts of a day or less start when the market opens, and longer charts span exactly the given duration,
+    so the parameters do not depend on the market hours."""
+    end_time = datetime.now()
+    return Instrument.historical_params(end_time - span, end_time)
 
-def get_indexes_and_title(aggregator: Aggregator, identifiers: set[str]) -> tuple[list[Index], str]:
+def get_indexes_and_title(aggregator: Aggregator, identifiers: set[str], historical_params: dict = None) -> tuple[list[Index], str]:
     # Remove duplicates by converting to set (and back)
     identifiers = set(identifiers.upper().split(','))
     if len(identifiers) > 10:
@@ -76,8 +99,8 @@ def get_indexes_and_title(aggregator: Aggregator, identifiers: set[str]) -> tupl
                     indexes.append(index)
                     identifiers.discard(identifier)
 
-    # Load instruments for all index assets and identifiers
-    aggregator.load_instruments(*indexes, *identifiers)
+    # Load instruments for all index assets and identifiers, along with their quotes and historicals
+    aggregator.load_instruments(*indexes, *identifiers, historical_params=historical_params)
 
     # Wrap each of the remaining non-index instruments in its own index
     for identifier in identifiers:
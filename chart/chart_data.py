@@ -1,6 +1,12 @@
+from __future__ import annotations
+from typing import TYPE_CHECKING
+
+import numpy as np
 import pandas as pd
 
-from indexes.models import Asset
+if TYPE_CHECKING:
+    # Not imported at runtime, so that charts can be rendered in processes without Django
+    from indexes.models import Asset
 
 import logging
 logger = logging.getLogger('stockbot')
@@ -31,8 +37,7 @@ class ChartData():
 
         self.reference_price = self.__get_reference_price(valid_assets, historicals, start_time)
 
-        chart_price_map = self.__get_chart_price_map(valid_assets, historicals, start_time, end_time)
-        self.series = pd.Series(chart_price_map)
+        self.series = pd.Series(self.__get_chart_price_map(valid_assets, historicals, start_time, end_time))
 
     def __get_index_current_value(self, assets, quotes):
         current_value = 0
@@ -61,14 +66,13 @@ class ChartData():
             else:
                 asset_reference_price = 0
                 # Use the first non-zero price value
-                for h in asset_historicals.items:
-                    if h.begins_at >= start_time:
-                        if h.open_price > 0:
-                            asset_reference_price = h.open_price
-                        elif h.close_price > 0:
-                            asset_reference_price = h.close_price
-                        if asset_reference_price:
-                            break
+                columns = asset_historicals.columns()
+                after_start = columns.begins_at >= np.datetime64(start_time)
+                prices = np.where(columns.open_price > 0, columns.open_price,
+                    np.where(columns.close_price > 0, columns.close_price, 0))[after_start]
+                nonzero_prices = np.flatnonzero(prices)
+                if nonzero_prices.size:
+                    asset_reference_price = prices[nonzero_prices[0]]
 
             reference_price += asset_reference_price * asset.count * asset.unit_count()
 
@@ -76,15 +80,37 @@ class ChartData():
         return reference_price
 
     def __get_chart_price_map(self, assets, historicals, start_time, end_time):
-        chart_price_map = {}
+        """Series: The combined value of the assets at each time any of them has a data point.
+        Each asset's value at a time it has no data point for is taken from its previous data point,
+        or its first data point for times before it has any, rather than being left out of the total."""
+        if not assets:
+            return {}
+
+        start_time = np.datetime64(start_time)
+        end_time = np.datetime64(end_time)
 
+        asset_times = []
+        asset_prices = []
         for asset in assets:
-            asset_historicals = historicals[asset.instrument_url]
-            for h in asset_historicals.items:
-                # Check if the option is expired at this time
-                if start_time <= h.begins_at <= end_time:
-                    if h.begins_at not in chart_price_map:
-                        chart_price_map[h.begins_at] = 0
-
-                    chart_price_map[h.begins_at] += h.close_price * asset.count * asset.unit_count()
-        return chart_price_map
+            columns = historicals[asset.instrument_url].columns()
+            # Check if the option is expired at this time
+            in_range = (columns.begins_at >= start_time) & (columns.begins_at <= end_time) & ~np.isnan(columns.close_price)
+            asset_times.append(columns.begins_at[in_range])
+            asset_prices.append(columns.close_price[in_range])
+
+        # Times at which any asset has a data point
+        grid = np.unique(np.concatenate(asset_times))
+        if not grid.size:
+            return {}
+
+        # Price of each asset (rows) at each time in the grid (columns)
+        prices = np.zeros((len(assets), grid.size))
+        for row, (times, asset_price) in enumerate(zip(asset_times, asset_prices)):
+            if not times.size:
+                continue
+            # Index of the latest data point at or before each time, or the first data point for earlier times
+            positions = np.maximum(np.searchsorted(times, grid, side='right') - 1, 0)
+            prices[row] = asset_price[positions]
+
+        weights = np.array([asset.count * asset.unit_count() for asset in assets], dtype=np.float64)
+        return pd.Series(weights @ prices, index=grid)
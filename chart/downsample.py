@@ -0,0 +1,47 @@
+import numpy as np
+
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """Downsamples a line using the Largest-Triangle-Three-Buckets algorithm.
+
+    The points between the first and last points are divided into `threshold - 2` buckets, and the
+    point chosen from each bucket is the one forming the largest triangle with the point chosen from
+    the previous bucket and the average of the next bucket. This keeps peaks and troughs that would
+    be lost by simply taking every nth point.
+
+    Returns the (sorted) indices of the points to keep. All points are kept if there are no more
+    than `threshold` of them.
+    """
+    num_points = len(x)
+    if threshold >= num_points or threshold < 3:
+        return np.arange(num_points)
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+
+    # Bucket boundaries for the points between the first and last points
+    bucket_size = (num_points - 2) / (threshold - 2)
+    edges = (np.arange(threshold - 1) * bucket_size).astype(np.int64) + 1
+    edges[-1] = num_points - 1
+
+    indices = np.empty(threshold, dtype=np.int64)
+    indices[0] = 0
+    indices[-1] = num_points - 1
+
+    selected = 0
+    for bucket in range(threshold - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        if bucket + 2 < len(edges):
+            next_start, next_end = end, edges[bucket + 2]
+        else:
+            # The last point forms the final bucket
+            next_start, next_end = num_points - 1, num_points
+        next_x = x[next_start:next_end].mean()
+        next_y = y[next_start:next_end].mean()
+
+        # Twice the area of the triangle formed with each point in the bucket
+        areas = np.abs((x[selected] - next_x) * (y[start:end] - y[selected])
+            - (x[selected] - x[start:end]) * (next_y - y[selected]))
+        selected = start + int(np.argmax(areas))
+        indices[bucket + 1] = selected
+
+    return indices
@@ -0,0 +1,45 @@
+from collections import OrderedDict
+from threading import Lock
+
+class LayerCache():
+    """Least-recently-used cache of pre-rendered chart layers.
+
+    A layer is an RGBA image of the elements that are drawn the same way on many charts, such as
+    the time axis. Laying out and rasterizing ticks and their labels makes up much of the time taken
+    to render a chart, so each layer is rendered once and composited onto every chart using it.
+    Layers are keyed on everything they display, so a layer is never reused once its contents change.
+    """
+    def __init__(self, max_entries=64):
+        self.max_entries = max_entries
+        self.layers = OrderedDict()
+        self.lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, render):
+        """The layer for the key, calling `render` to create it if it is not cached."""
+        with self.lock:
+            layer = self.layers.get(key)
+            if layer is not None:
+                self.layers.move_to_end(key)
+                self.hits += 1
+                return layer
+            self.misses += 1
+
+        layer = render()
+        with self.lock:
+            self.layers[key] = layer
+            self.layers.move_to_end(key)
+            while len(self.layers) > self.max_entries:
+                self.layers.popitem(last=False)
+        return layer
+
+    def clear(self):
+        with self.lock:
+            self.layers.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        with self.lock:
+            return {'hits': self.hits, 'misses': self.misses, 'layers': len(self.layers)}
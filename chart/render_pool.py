@@ -0,0 +1,257 @@
+"""Optional pool of processes dedicated to rendering charts.
+
+Rendering a chart with matplotlib is CPU-bound and holds the GIL, so a slow chart rendered in a
+worker process stalls every other request handled by that process. When CHART_RENDER_PROCESSES is
+set, charts are instead rendered by a pool of separate processes, started with matplotlib already
+imported and its font cache loaded.
+
+The price series of a chart are copied into a single shared memory block for the render process
+to read, rather than being pickled as pandas objects. Only the small remainder of the chart's
+definition is pickled. The render process returns the chart's PNG data.
+
+This module is imported by the render processes, so it must not depend on Django being set up.
+"""
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+from threading import Lock
+from time import monotonic
+from types import SimpleNamespace
+import multiprocessing
+import logging
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+from chart.chart import Chart
+from chart.chart_data import ChartData
+
+logger = logging.getLogger('stockbot')
+
+class ChartSpec():
+    """Everything needed to render a chart, once its data has been loaded."""
+
+    MARKET_HOURS_ATTRIBUTES = ('opens_at', 'closes_at', 'extended_opens_at', 'extended_closes_at', 'is_open')
+
+    def __init__(self, title, span, market_timezone, market_hours, hide_value, chart_data_sets: list[ChartData], show_price):
+        self.title = title
+        self.span = span
+        self.market_timezone = market_timezone
+        self.market_hours = market_hours
+        self.hide_value = hide_value
+        self.chart_data_sets = chart_data_sets
+        self.show_price = show_price
+
+    def create_chart(self) -> Chart:
+        chart = Chart(self.title, self.span, self.market_timezone, self.market_hours, self.hide_value)
+        chart.plot(*self.chart_data_sets, show_price=self.show_price)
+        return chart
+
+    def render(self) -> bytes:
+        return self.create_chart().get_img_data()
+
+    def pack(self, shm: shared_memory.SharedMemory = None):
+        """Copies the price series of this chart into shared memory.
+        Returns the size of shared memory needed if `shm` is not provided, along with the rest
+        of the chart's definition to pass to `unpack`."""
+        offset = 0
+        data_sets = []
+        for chart_data in self.chart_data_sets:
+            series = chart_data.series
+            length = len(series)
+            if shm and length:
+                times = np.ndarray((length,), dtype=np.int64, buffer=shm.buf, offset=offset)
+                times[:] = series.index.values.astype('datetime64[us]').view(np.int64)
+                values = np.ndarray((length,), dtype=np.float64, buffer=shm.buf, offset=offset + length * 8)
+                values[:] = series.values
+            data_sets.append((chart_data.name, chart_data.identifier, chart_data.current_price,
+                chart_data.reference_price, offset, length))
+            offset += length * 16
+
+        market_hours = {a: getattr(self.market_hours, a) for a in ChartSpec.MARKET_HOURS_ATTRIBUTES}
+        return offset, (self.title, self.span, self.market_timezone, market_hours, self.hide_value, data_sets, self.show_price)
+
+    @classmethod
+    def unpack(cls, shm: shared_memory.SharedMemory, definition):
+        title, span, market_timezone, market_hours, hide_value, data_sets, show_price = definition
+        chart_data_sets = []
+        for name, identifier, current_price, reference_price, offset, length in data_sets:
+            chart_data = ChartData(name, identifier, [])
+            chart_data.current_price = current_price
+            chart_data.reference_price = reference_price
+            if length:
+                # Copied out of shared memory, since charts modify their series while plotting
+                times = np.ndarray((length,), dtype=np.int64, buffer=shm.buf, offset=offset).view('datetime64[us]')
+                values = np.ndarray((length,), dtype=np.float64, buffer=shm.buf, offset=offset + length * 8)
+                chart_data.series = pd.Series(values.copy(), index=pd.DatetimeIndex(times.copy()))
+            else:
+                chart_data.series = pd.Series({})
+            chart_data_sets.append(chart_data)
+        return cls(title, span, market_timezone, SimpleNamespace(**market_hours), hide_value, chart_data_sets, show_price)
+
+class RenderPool():
+    """Pool of chart render processes, one per worker process.
+
+    If the number of charts waiting on the pool reaches its queue limit, or the pool fails,
+    charts are rendered in the calling process instead.
+    """
+    DEFAULT_PROCESSES = 0
+    DEFAULT_MAX_QUEUE_SIZE = 32
+    DEFAULT_TIMEOUT = 30
+
+    def __init__(self):
+        self.lock = Lock()
+        self.pool = None
+        self.pid = None
+        self.in_flight = 0
+        self.metrics = {
+            'submitted': 0,
+            'completed': 0,
+            'failed': 0,
+            'rendered_in_caller': 0,
+            'max_queue_depth': 0,
+            'total_latency_secs': 0.0,
+            'max_latency_secs': 0.0,
+            'total_render_secs': 0.0,
+            'max_render_secs': 0.0
+        }
+
+    def render(self, chart_spec: ChartSpec) -> bytes:
+        """bytes: PNG data of the chart, rendered by the pool if it is enabled."""
+        pool = self.__acquire()
+        if not pool:
+            return chart_spec.render()
+
+        started_at = monotonic()
+        size, definition = chart_spec.pack()
+        shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        try:
+            chart_spec.pack(shm)
+            img_data, render_secs = pool.submit(_render_shared, shm.name, definition).result(self.timeout())
+        except (BrokenProcessPool, TimeoutError) as e:
+            logger.warning("Chart render process failed, rendering in this process instead: {}".format(repr(e)))
+            self.__release(failed=True)
+            self.__shutdown(pool)
+            return chart_spec.render()
+        except BaseException:
+            self.__release(failed=True)
+            raise
+        finally:
+            shm.close()
+            shm.unlink()
+
+        self.__release(latency_secs=monotonic() - started_at, render_secs=render_secs)
+        return img_data
+
+    def start(self):
+        """Starts the render processes in advance, if the pool is enabled."""
+        pool = self.__pool()
+        if pool:
+            for _ in range(self.processes()):
+                pool.submit(_warm_up)
+
+    def shutdown(self):
+        with self.lock:
+            pool = self.pool
+            self.pool = None
+        if pool:
+            pool.shutdown()
+
+    def stats(self):
+        """dict: Current queue depth, and counters for renders and their latencies."""
+        with self.lock:
+            stats = dict(self.metrics)
+            stats['queue_depth'] = self.in_flight
+        stats['processes'] = self.processes()
+        if stats['completed']:
+            stats['avg_latency_secs'] = stats['total_latency_secs'] / stats['completed']
+            stats['avg_render_secs'] = stats['total_render_secs'] / stats['completed']
+        return stats
+
+    def processes(self):
+        return self.__setting('CHART_RENDER_PROCESSES', self.DEFAULT_PROCESSES)
+
+    def max_queue_size(self):
+        return self.__setting('CHART_RENDER_MAX_QUEUE_SIZE', self.DEFAULT_MAX_QUEUE_SIZE)
+
+    def timeout(self):
+        return self.__setting('CHART_RENDER_TIMEOUT', self.DEFAULT_TIMEOUT)
+
+    def __acquire(self):
+        pool = self.__pool()
+        if not pool:
+            return None
+        with self.lock:
+            if self.in_flight >= self.max_queue_size():
+                self.metrics['rendered_in_caller'] += 1
+                return None
+            self.in_flight += 1
+            self.metrics['submitted'] += 1
+            self.metrics['max_queue_depth'] = max(self.metrics['max_queue_depth'], self.in_flight)
+        return pool
+
+    def __release(self, failed=False, latency_secs=0.0, render_secs=0.0):
+        with self.lock:
+            self.in_flight -= 1
+            if failed:
+                self.metrics['failed'] += 1
+                return
+            self.metrics['completed'] += 1
+            self.metrics['total_latency_secs'] += latency_secs
+            self.metrics['max_latency_secs'] = max(self.metrics['max_latency_secs'], latency_secs)
+            self.metrics['total_render_secs'] += render_secs
+            self.metrics['max_render_secs'] = max(self.metrics['max_render_secs'], render_secs)
+
+    def __pool(self):
+        processes = self.processes()
+        if not processes:
+            return None
+        with self.lock:
+            if self.pool is None or self.pid != os.getpid():
+                # Processes belonging to the parent of a forked worker cannot be used by the worker
+                context = multiprocessing.get_context('spawn')
+                context.set_executable(self.__python())
+                self.pool = ProcessPoolExecutor(processes, mp_context=context, initializer=_warm_up)
+                self.pid = os.getpid()
+            return self.pool
+
+    def __shutdown(self, pool):
+        with self.lock:
+            if self.pool is pool:
+                self.pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def __python(self):
+        python = self.__setting('CHART_RENDER_PYTHON', None)
+        if python:
+            return python
+        if os.path.basename(sys.executable).startswith('python'):
+            return sys.executable
+        # Embedded interpreters such as uwsgi's report their own executable instead
+        return os.path.join(sys.exec_prefix, 'bin', 'python3')
+
+    def __setting(self, name, default):
+        from django.conf import settings
+        return getattr(settings, name, default)
+
+def _warm_up():
+    # Draw some text, so that matplotlib loads its fonts before the first chart is rendered
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+    figure = Figure(figsize=Chart.size)
+    FigureCanvasAgg(figure)
+    figure.text(0.5, 0.5, '$0.00 (+0.00%)')
+    figure.canvas.draw()
+
+def _render_shared(shm_name, definition):
+    started_at = monotonic()
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        img_data = ChartSpec.unpack(shm, definition).render()
+    finally:
+        shm.close()
+    return img_data, monotonic() - started_at
+
+render_pool = RenderPool()
@@ -1,24 +1,157 @@
 from django.core.cache import caches
+from django.core.cache.backends.base import InvalidCacheBackendError
+from threading import Lock
+from time import time
 import hashlib
 
+class TimeoutPolicy():
+    """Adjusts the timeout of a cache entry at the time it is cached,
+    e.g. to keep data for longer when it is known not to change."""
+    def timeout(self, timeout):
+        """int: Returns the number of seconds to cache an entry for, given its default timeout.
+        A timeout of None caches the entry indefinitely, and a timeout of 0 does not cache it."""
+        return timeout
+
+class StaleableValue():
+    """A cached value stored along with the time at which it becomes stale,
+    so that the value and its staleness are always evicted together."""
+    __slots__ = ('value', 'stale_at')
+
+    def __init__(self, value, stale_at):
+        self.value = value
+        self.stale_at = stale_at
+
+    def __getstate__(self):
+        return (self.value, self.stale_at)
+
+    def __setstate__(self, state):
+        self.value, self.stale_at = state
+
 class Cache():
+    """Two-tier cache.
+
+    Values are read from a small in-process cache (L1) first, falling back to the cache shared
+    by all worker processes (L2). Values are written to both tiers. Entries are kept in L1 for
+    at most L1's own timeout, so that changes made by other processes are picked up quickly.
+    """
+    # Hits and misses for each tier
+    stats_lock = Lock()
+    tier_stats = {
+        'l1': {'hits': 0, 'misses': 0},
+        'l2': {'hits': 0, 'misses': 0}
+    }
+
     @classmethod
-    def set(cls, key, value, timeout=None):
-        caches[cls.cache_name()].set(Cache.__cache_key(key), value, timeout)
+    def set(cls, key, value, timeout=None, hard_timeout=None, policy: TimeoutPolicy=None):
+        """Caches a value for `timeout` seconds.
+        If a `hard_timeout` longer than `timeout` is provided, the value is kept until the hard timeout,
+        but is reported as stale by `get_with_staleness` once `timeout` has passed.
+        If a `policy` is provided, it is applied to both timeouts."""
+        if policy:
+            timeout = policy.timeout(timeout)
+            if hard_timeout:
+                hard_timeout = policy.timeout(hard_timeout)
+            if timeout == 0:
+                # Policy indicates that the value should not be cached
+                return
+
+        if timeout is not None and hard_timeout and hard_timeout > timeout:
+            cls.__set_many({Cache.__cache_key(key): StaleableValue(value, time() + timeout)}, hard_timeout)
+        else:
+            cls.__set_many({Cache.__cache_key(key): value}, timeout)
+
+    @classmethod
+    def add(cls, key, value, timeout=None):
+        """bool: Caches a value only if the key is not already cached, returning whether it was added.
+        Only the shared cache is used, so that this can be used to coordinate between processes."""
+        return caches[cls.cache_name()].add(Cache.__cache_key(key), value, timeout)
+
+    @classmethod
+    def get_shared(cls, key):
+        """Returns the value for the key from the shared cache, bypassing the local cache."""
+        return Cache.__unpack(caches[cls.cache_name()].get(Cache.__cache_key(key)))[0]
 
     @classmethod
     def get(cls, key):
-        return caches[cls.cache_name()].get(Cache.__cache_key(key))
+        return cls.get_with_staleness(key)[0]
+
+    @classmethod
+    def get_with_staleness(cls, key):
+        """tuple: The cached value for the key, and whether or not that value is past its soft timeout."""
+        cache_key = Cache.__cache_key(key)
+        value, stale_at = Cache.__unpack(cls.__get_many([cache_key]).get(cache_key))
+        return value, stale_at is not None and time() >= stale_at
 
     @classmethod
     def delete(cls, key):
-        return caches[cls.cache_name()].delete(Cache.__cache_key(key))
+        cache_key = Cache.__cache_key(key)
+        local_cache = cls.local_cache()
+        if local_cache:
+            local_cache.delete(cache_key)
+        return caches[cls.cache_name()].delete(cache_key)
 
     @classmethod
     def cache_name(cls):
         # Get the default cache
         return 'default'
 
+    @classmethod
+    def local_cache_name(cls):
+        # In-process cache used in front of the default cache
+        return 'local'
+
+    @classmethod
+    def local_cache(cls):
+        try:
+            return caches[cls.local_cache_name()]
+        except InvalidCacheBackendError:
+            # No local cache tier configured
+            return None
+
+    @classmethod
+    def stats(cls):
+        """dict: Number of hits and misses for each cache tier."""
+        with Cache.stats_lock:
+            return {tier: dict(counts) for tier, counts in Cache.tier_stats.items()}
+
+    @classmethod
+    def __get_many(cls, cache_keys):
+        values = {}
+        local_cache = cls.local_cache()
+        if local_cache:
+            values = local_cache.get_many(cache_keys)
+            Cache.__record('l1', hit=cache_keys[0] in values)
+
+        missing_keys = [k for k in cache_keys if k not in values]
+        if missing_keys:
+            shared_values = caches[cls.cache_name()].get_many(missing_keys)
+            Cache.__record('l2', hit=cache_keys[0] in shared_values)
+            if local_cache and shared_values:
+                # Timeouts of shared values are unknown, so only keep them for L1's own timeout
+                local_cache.set_many(shared_values)
+            values.update(shared_values)
+        return values
+
+    @classmethod
+    def __set_many(cls, values, timeout):
+        local_cache = cls.local_cache()
+        if local_cache:
+            local_timeout = local_cache.default_timeout
+            if timeout is not None:
+                local_timeout = min(timeout, local_timeout)
+            local_cache.set_many(values, local_timeout)
+        caches[cls.cache_name()].set_many(values, timeout)
+
+    def __unpack(cached):
+        # Returns the value and the time it becomes stale, if any
+        if isinstance(cached, StaleableValue):
+            return cached.value, cached.stale_at
+        return cached, None
+
+    def __record(tier, hit):
+        with Cache.stats_lock:
+            Cache.tier_stats[tier]['hits' if hit else 'misses'] += 1
+
     def __cache_key(key_str):
         # Cache key must be shorter than than 250 characters
         # and cannot have any whitespace or control characters
@@ -0,0 +1,154 @@
+from django.core.cache.backends.base import BaseCache, DEFAULT_TIMEOUT
+from threading import local
+from time import time
+import logging
+import os
+import pickle
+import sqlite3
+
+logger = logging.getLogger('stockbot')
+
+class SQLiteCache(BaseCache):
+    """Django cache backend storing entries in a SQLite database on local disk.
+
+    Every process using the same LOCATION shares the same entries, so this can serve as a cache
+    shared between the worker processes of a multi-process runner such as uwsgi, without having
+    to run a separate cache service.
+
+    Cache failures (e.g. the database being locked for too long) are logged and treated as misses.
+    """
+    # Number of writes between checks for whether the cache needs to be culled
+    CULL_CHECK_INTERVAL = 100
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self.path = location
+        self.connections = local()
+        self.writes = 0
+
+    def connection(self) -> sqlite3.Connection:
+        # Connections cannot be shared between threads, or with the parent of a forked process
+        connection = getattr(self.connections, 'connection', None)
+        if connection is None or self.connections.pid != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute('CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL)')
+            connection.execute('CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires)')
+            self.connections.connection = connection
+            self.connections.pid = os.getpid()
+        return connection
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.__key(key, version)
+        try:
+            connection = self.connection()
+            connection.execute('DELETE FROM cache WHERE key = ? AND expires <= ?', (key, time()))
+            cursor = connection.execute('INSERT OR IGNORE INTO cache (key, value, expires) VALUES (?, ?, ?)',
+                (key, self.__dumps(value), self.get_backend_timeout(timeout)))
+            self.__cull_if_needed()
+            return cursor.rowcount > 0
+        except sqlite3.Error as e:
+            logger.warning("Could not add cache entry: {}".format(e))
+            return False
+
+    def get(self, key, default=None, version=None):
+        return self.get_many([key], version).get(key, default)
+
+    def get_many(self, keys, version=None):
+        cache_keys = {self.__key(key, version): key for key in keys}
+        if not cache_keys:
+            return {}
+        placeholders = ','.join('?' * len(cache_keys))
+        try:
+            rows = self.connection().execute(
+                'SELECT key, value, expires FROM cache WHERE key IN ({})'.format(placeholders),
+                list(cache_keys)).fetchall()
+        except sqlite3.Error as e:
+            logger.warning("Could not read cache entries: {}".format(e))
+            return {}
+
+        now = time()
+        values = {}
+        for cache_key, value, expires in rows:
+            if expires is None or expires > now:
+                values[cache_keys[cache_key]] = pickle.loads(value)
+        return values
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.set_many({key: value}, timeout, version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        expires = self.get_backend_timeout(timeout)
+        rows = [(self.__key(key, version), self.__dumps(value), expires) for key, value in data.items()]
+        try:
+            connection = self.connection()
+            with connection:
+                connection.execute('BEGIN')
+                connection.executemany('INSERT OR REPLACE INTO cache (key, value, expires) VALUES (?, ?, ?)', rows)
+            self.__cull_if_needed()
+        except sqlite3.Error as e:
+            logger.warning("Could not write cache entries: {}".format(e))
+        return []
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        try:
+            cursor = self.connection().execute('UPDATE cache SET expires = ? WHERE key = ? AND (expires IS NULL OR expires > ?)',
+                (self.get_backend_timeout(timeout), self.__key(key, version), time()))
+            return cursor.rowcount > 0
+        except sqlite3.Error as e:
+            logger.warning("Could not update cache entry: {}".format(e))
+            return False
+
+    def delete(self, key, version=None):
+        return self.delete_many([key], version)
+
+    def delete_many(self, keys, version=None):
+        cache_keys = [self.__key(key, version) for key in keys]
+        if not cache_keys:
+            return False
+        try:
+            cursor = self.connection().execute(
+                'DELETE FROM cache WHERE key IN ({})'.format(','.join('?' * len(cache_keys))), cache_keys)
+            return cursor.rowcount > 0
+        except sqlite3.Error as e:
+            logger.warning("Could not delete cache entries: {}".format(e))
+            return False
+
+    def has_key(self, key, version=None):
+        return bool(self.get_many([key], version))
+
+    def clear(self):
+        try:
+            self.connection().execute('DELETE FROM cache')
+        except sqlite3.Error as e:
+            logger.warning("Could not clear cache: {}".format(e))
+
+    def close(self, **kwargs):
+        # Connections are kept open for the lifetime of each thread
+        pass
+
+    def __key(self, key, version):
+        key = self.make_key(key, version)
+        self.validate_key(key)
+        return key
+
+    def __dumps(self, value):
+        return sqlite3.Binary(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+
+    def __cull_if_needed(self):
+        self.writes += 1
+        if self.writes % self.CULL_CHECK_INTERVAL:
+            return
+
+        connection = self.connection()
+        connection.execute('DELETE FROM cache WHERE expires <= ?', (time(),))
+        count = connection.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+        if count > self._max_entries:
+            # Remove the entries closest to expiring
+            num_to_remove = count // self._cull_frequency if self._cull_frequency else count
+            connection.execute('DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY expires IS NULL, expires LIMIT ?)',
+                (num_to_remove,))
@@ -1,21 +1,208 @@
-from multiprocessing.pool import ThreadPool
+from collections import deque
+from threading import Condition, Event, Lock, Thread
+from time import monotonic
+from django.conf import settings
+from django.db import close_old_connections
+import logging
+import os
 
-class thread_pool():
-    def __init__(self, num_threads):
-        self.pool = Pool(num_threads)
+logger = logging.getLogger('stockbot')
+
+class Task():
+    """Handle for a function submitted to the executor.
+    Provides the same `get()` interface as the AsyncResult of a multiprocessing pool."""
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+
+    def __init__(self, executor, method, args, kwargs):
+        self.executor = executor
+        self.method = method
+        self.args = args
+        self.kwargs = kwargs
+        self.state = Task.PENDING
+        self.lock = Lock()
+        self.done = Event()
+        self.result = None
+        self.exception = None
+        self.submitted_at = monotonic()
+
+    def claim(self):
+        """bool: Marks the task as running. Returns False if it has already been claimed by another thread."""
+        with self.lock:
+            if self.state != Task.PENDING:
+                return False
+            self.state = Task.RUNNING
+            return True
+
+    def run(self):
+        started_at = monotonic()
+        try:
+            self.result = self.method(*self.args, **self.kwargs)
+        except BaseException as e:
+            self.exception = e
+        finally:
+            self.state = Task.DONE
+            self.done.set()
+            self.executor.record_task(started_at - self.submitted_at, monotonic() - started_at)
+
+    def get(self, timeout=None):
+        if self.claim():
+            # No worker has picked up this task yet; run it in the calling thread rather than waiting on it.
+            # This also prevents deadlocks when tasks running in the executor wait on other tasks.
+            self.executor.record_inline_task()
+            self.run()
+
+        if timeout is None:
+            timeout = self.executor.task_timeout()
+        if not self.done.wait(timeout):
+            raise TimeoutError("Task {} did not complete within {} seconds".format(self.method.__qualname__, timeout))
+
+        if self.exception:
+            raise self.exception
+        return self.result
+
+    def wait(self, timeout=None):
+        """bool: Waits for the task to complete without running it in the calling thread.
+        Returns whether the task completed within the timeout."""
+        return self.done.wait(timeout)
+
+    def ready(self):
+        return self.done.is_set()
+
+class Executor():
+    """Thread pool shared by the whole process.
+
+    Threads are started as needed, up to a maximum number of workers, and are reused across requests.
+    When a multi-process runner such as uwsgi forks a worker process, threads from the parent process
+    do not exist in the child, so the executor discards its state and starts new threads in the child.
+    """
+    DEFAULT_MAX_WORKERS = 16
+    DEFAULT_MAX_QUEUE_SIZE = 256
+    DEFAULT_TASK_TIMEOUT = 60
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.pid = os.getpid()
+        self.condition = Condition()
+        self.queue = deque()
+        self.threads = []
+        self.idle_threads = 0
+        self.stats_lock = Lock()
+        self.metrics = {
+            'submitted': 0,
+            'completed': 0,
+            'ran_in_caller': 0,
+            'rejected': 0,
+            'max_queue_depth': 0,
+            'total_wait_secs': 0.0,
+            'max_wait_secs': 0.0,
+            'total_run_secs': 0.0,
+            'max_run_secs': 0.0
+        }
+
+    def submit(self, method, *args, **kwargs) -> Task:
+        """Submits a task to be run by the executor.
+        If the queue is full, the task is run immediately in the calling thread instead."""
+        task = self.__enqueue(method, args, kwargs)
+        if not task:
+            task = Task(self, method, args, kwargs)
+            task.claim()
+            task.run()
+        return task
+
+    def submit_background(self, method, *args, **kwargs) -> Task:
+        """Submits a task which no caller will wait on. Returns None if the queue is full."""
+        return self.__enqueue(method, args, kwargs)
+
+    def __enqueue(self, method, args, kwargs):
+        if self.pid != os.getpid():
+            # Forked into a new process, none of the parent's threads are running here
+            self.reset()
 
+        task = Task(self, method, args, kwargs)
+        with self.condition:
+            if len(self.queue) >= self.max_queue_size():
+                with self.stats_lock:
+                    self.metrics['rejected'] += 1
+                return None
+
+            self.queue.append(task)
+            self.condition.notify()
+            if self.idle_threads < len(self.queue) and len(self.threads) < self.max_workers():
+                self.__start_thread()
+
+            with self.stats_lock:
+                self.metrics['submitted'] += 1
+                self.metrics['max_queue_depth'] = max(self.metrics['max_queue_depth'], len(self.queue))
+        return task
+
+    def __start_thread(self):
+        thread = Thread(target=self.__work, name="executor-{}".format(len(self.threads)), daemon=True)
+        self.threads.append(thread)
+        thread.start()
+
+    def __work(self):
+        while True:
+            with self.condition:
+                self.idle_threads += 1
+                while not self.queue:
+                    self.condition.wait()
+                self.idle_threads -= 1
+                task = self.queue.popleft()
+
+            if task.claim():
+                task.run()
+                # Don't keep database connections open across unrelated tasks
+                close_old_connections()
+
+    def record_task(self, wait_secs, run_secs):
+        with self.stats_lock:
+            self.metrics['completed'] += 1
+            self.metrics['total_wait_secs'] += wait_secs
+            self.metrics['max_wait_secs'] = max(self.metrics['max_wait_secs'], wait_secs)
+            self.metrics['total_run_secs'] += run_secs
+            self.metrics['max_run_secs'] = max(self.metrics['max_run_secs'], run_secs)
+
+    def record_inline_task(self):
+        with self.stats_lock:
+            self.metrics['ran_in_caller'] += 1
+
+    def stats(self):
+        """dict: Current queue depth and thread count, and counters for tasks and their latencies."""
+        with self.stats_lock:
+            stats = dict(self.metrics)
+        stats['queue_depth'] = len(self.queue)
+        stats['threads'] = len(self.threads)
+        if stats['completed']:
+            stats['avg_wait_secs'] = stats['total_wait_secs'] / stats['completed']
+            stats['avg_run_secs'] = stats['total_run_secs'] / stats['completed']
+        return stats
+
+    def max_workers(self):
+        return getattr(settings, 'EXECUTOR_MAX_WORKERS', self.DEFAULT_MAX_WORKERS)
+
+    def max_queue_size(self):
+        return getattr(settings, 'EXECUTOR_MAX_QUEUE_SIZE', self.DEFAULT_MAX_QUEUE_SIZE)
+
+    def task_timeout(self):
+        return getattr(settings, 'EXECUTOR_TASK_TIMEOUT', self.DEFAULT_TASK_TIMEOUT)
+
+executor = Executor()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=executor.reset)
+
+class thread_pool():
+    """Context manager for submitting a batch of calls to the shared executor."""
     def __enter__(self):
-        return self.pool
+        return Pool()
 
     def __exit__(self, type, value, traceback):
-        self.pool.close()
+        pass
 
 class Pool():
-    def __init__(self, num_threads):
-        self.pool = ThreadPool(processes=num_threads)
-
-    def call(self, method, *args, **kwargs):
-        return self.pool.apply_async(method, tuple(args), kwargs)
-
-    def close(self):
-        self.pool.close()
+    def call(self, method, *args, **kwargs) -> Task:
+        return executor.submit(method, *args, **kwargs)
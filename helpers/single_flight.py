@@ -0,0 +1,49 @@
+"""Deduplicates concurrent calls for the same key.
+
+The first caller for a key executes the call, while any other caller requesting
+the same key before the call completes waits for and shares its result
+(or its exception) instead of making the call again.
+"""
+from concurrent.futures import Future
+from threading import Lock
+
+class SingleFlight():
+    def __init__(self):
+        self.lock = Lock()
+        self.in_flight: dict[str, Future] = {}
+        self.calls = 0
+        self.shared = 0
+
+    def call(self, key, method, *args, **kwargs):
+        with self.lock:
+            future = self.in_flight.get(key)
+            if future:
+                self.shared += 1
+                leader = False
+            else:
+                future = Future()
+                self.in_flight[key] = future
+                self.calls += 1
+                leader = True
+
+        if not leader:
+            return future.result()
+
+        try:
+            future.set_result(method(*args, **kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            with self.lock:
+                del self.in_flight[key]
+
+        return future.result()
+
+    def stats(self):
+        """dict: Number of calls executed, and the number of calls saved by sharing an in-flight result."""
+        with self.lock:
+            return {
+                'calls': self.calls,
+                'shared': self.shared,
+                'in_flight': len(self.in_flight)
+            }
@@ -1,4 +1,4 @@
-from uuid import uuid4
+from uuid import uuid4, uuid5, NAMESPACE_URL
 from robinhood.models import *
 from robinhood.option_handler import OptionHandler
 from datetime import date, datetime, timedelta
@@ -8,27 +8,34 @@ import random
 
 option_handler = OptionHandler()
 
+# Mocked options of each option chain, by chain ID, expiration date and (strike price, type)
+mock_chains = {}
+
 def mock_market():
-    now = datetime.now(timezone('US/Eastern'))
-    # Rebuild to make it timezone-unaware while still keeping the correct timezone-aware date
-    now = datetime(year=now.year, month=now.month, day=now.day)
+    # Market hours are compared with the current time, so they are mocked around it
+    # for charts to be drawn the same way at any time of day, and in any time zone
+    now = datetime.now().replace(second=0, microsecond=0)
+    market_date = datetime.now(timezone('US/Eastern')).date()
     market = Market(
         name='New York Stock Exchange',
         acronym='NYSE',
         mic='XNYS',
         timezone='US/Eastern',
     )
-    market_hours = Market.Hours(
-        opens_at=now.replace(hour=9, minute=30),
-        extended_opens_at=now.replace(hour=9, minute=0),
-        closes_at=now.replace(hour=16, minute=0),
-        extended_closes_at=now.replace(hour=18, minute=0),
-        is_open=True
-    )
     Market.mock_get(market, 'XNYS')
-    Market.Hours.mock_get(market_hours, "https://api.robinhood.com/markets/{}/hours/{}/"
-        .format(market.mic, now.date())
-    )
+    # The following days are mocked as well, for lookups of the next open session
+    for days_ahead in range(11):
+        day = now + timedelta(days=days_ahead)
+        market_hours = Market.Hours(
+            opens_at=day - timedelta(hours=1),
+            extended_opens_at=day - timedelta(hours=2),
+            closes_at=day + timedelta(hours=5),
+            extended_closes_at=day + timedelta(hours=7),
+            is_open=True
+        )
+        Market.Hours.mock_get(market_hours, "https://api.robinhood.com/markets/{}/hours/{}/"
+            .format(market.mic, market_date + timedelta(days=days_ahead))
+        )
 
 def mock_index_workflow(index_name, *stock_symbols):
     # Ensure that the check for a preexisting stock
@@ -46,6 +53,8 @@ def mock_stock_workflow(*symbols):
 
     Stock.mock_search(stocks, ids=[s.id for s in stocks])
     Stock.Quote.mock_search(quotes, instruments=instrument_urls)
+    # Searches for several stocks at once find them through their quotes
+    Stock.Quote.mock_search(quotes, symbols=[s.symbol for s in stocks])
     Stock.Historicals.mock_search(historicals, instruments=instrument_urls,
         span='day', interval='5minute', bounds='trading')
     if len(stocks) == 1:
@@ -65,6 +74,7 @@ def mock_stock(symbol, name=None):
         symbol=symbol,
         simple_name=name,
         name=name + ", Inc.",
+        tradable_chain_id=mock_chain_id(symbol),
         url='https://api.robinhood.com/instruments/' + id + '/'
     )
     Stock.mock_get(stock, stock.id)
@@ -148,7 +158,7 @@ def mock_option_workflow(*identifiers):
 
 def mock_option(chain_symbol, strike_price, type, expiration_date):
     id = str(uuid4())
-    chain_id = str(uuid4())
+    chain_id = mock_chain_id(chain_symbol)
     option_expiration_date = expiration_date or date.today()
     option = Option(
         id=id,
@@ -176,8 +186,28 @@ def mock_option(chain_symbol, strike_price, type, expiration_date):
         search_params['state'] = 'active'
 
     Option.mock_search(option, **search_params)
+    mock_option_chain(option)
     return option
 
+def mock_chain_id(chain_symbol):
+    # Options on the same stock share a chain
+    return str(uuid5(NAMESPACE_URL, chain_symbol))
+
+def mock_option_chain(option):
+    """Adds the option to its mocked chain, replacing any option with the same expiration, strike price and type."""
+    expirations = mock_chains.setdefault(option.chain_id, {})
+    options = expirations.setdefault(option.expiration_date, {})
+    options[(option.strike_price, option.type)] = option
+
+    chain = OptionChain(
+        id=option.chain_id,
+        symbol=option.chain_symbol,
+        can_open_position=True,
+        expiration_dates=sorted(e.isoformat() for e in expirations)
+    )
+    OptionChain.mock_get(chain, chain.id)
+    Option.mock_search(list(options.values()), chain_id=chain.id, expiration_dates=option.expiration_date)
+
 def mock_option_quote(instrument, price=random.uniform(10,100)):
     return Option.Quote(
         adjusted_mark_price=price,
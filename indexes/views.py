@@ -3,6 +3,7 @@ from helpers.utilities import mattermost_text, mattermost_table
 from quotes.aggregator import Aggregator
 from exceptions import BadRequestException
 from robinhood.models import Stock
+from quotes import instrument_catalog
 import re
 from django.db import connection
 
@@ -300,9 +301,14 @@ def validate_index_name(name):
     if name == 'EVERYONE':
         raise BadRequestException("'EVERYONE' is a reserved keyword. You must choose a different name for your index.")
     # Verify that this index name does not match a stock name
-    if Stock.search(symbol=name):
+    if name in instrument_catalog.find_by_symbols([name]) or stock_exists(name):
         raise BadRequestException("Can't use this name; a stock named {} already exists".format(name))
 
+def stock_exists(symbol):
+    stocks = Stock.search(symbol=symbol)
+    instrument_catalog.save(stocks)
+    return bool(stocks)
+
 
 def print_index(index, aggregator, is_owner=True):
     quotes = aggregator.quotes()
@@ -19,6 +19,8 @@ class Aggregator:
         self.instrument_map = {}
         self.quotes_map = {}
         self.historicals_map = {}
+        # Parameters the loaded historicals were requested with
+        self.historical_params = None
 
         self.instruments_loaded = False
         self.quotes_loaded = False
@@ -27,27 +29,56 @@ class Aggregator:
         if items:
             self.load_instruments(*items)
 
-    def load_instruments(self, *items):
+    def load_instruments(self, *items, historical_params=None):
+        """dict: Finds the instruments for the given items. If historical parameters are given,
+        the quotes and historicals of the instruments are fetched along with them: stocks and options
+        are found concurrently, and the market data of each starts being fetched as soon as they are found,
+        rather than once all instruments have been found."""
         self.stock_identifiers = set()
         self.option_identifiers = set()
 
         self.set_identifiers_to_load(items)
 
-        if self.stock_identifiers:
-            stocks = self.stock_handler.find_instruments(*self.stock_identifiers)
-            self.instrument_map.update(stocks)
-        if self.option_identifiers:
-            options = self.option_handler.find_instruments(*self.option_identifiers)
-            self.instrument_map.update(options)
+        # Instruments given directly do not need to be found
+        known_instruments = dict(self.instrument_map)
+
+        with thread_pool() as pool:
+            jobs = []
+            if self.stock_identifiers:
+                jobs.append(pool.call(self.__load, self.stock_handler, self.stock_identifiers, historical_params))
+            if self.option_identifiers:
+                jobs.append(pool.call(self.__load, self.option_handler, self.option_identifiers, historical_params))
+            if historical_params and known_instruments:
+                jobs.append(pool.call(self.__fetch_results, known_instruments, historical_params))
+
+        quotes = []
+        historicals = []
+        for job in jobs:
+            instruments, instrument_quotes, instrument_historicals = job.get()
+            self.instrument_map.update(instruments)
+            quotes.extend(instrument_quotes)
+            historicals.extend(instrument_historicals)
 
         self.instruments_loaded = True
 
-        # Allow quotes/historicals to be reloaded when instruments are reloaded
-        self.quotes_loaded = False
-        self.historicals_loaded = False
+        if historical_params:
+            self.quotes_map, self.historicals_map = self.map_results(quotes, historicals)
+            self.historical_params = historical_params
+            self.quotes_loaded = True
+            self.historicals_loaded = True
+        else:
+            # Allow quotes/historicals to be reloaded when instruments are reloaded
+            self.quotes_loaded = False
+            self.historicals_loaded = False
 
         return self.instrument_map
 
+    def __load(self, handler, identifiers, historical_params):
+        instruments = handler.find_instruments(*identifiers)
+        if not historical_params:
+            return instruments, [], []
+        return self.__fetch_results(instruments, historical_params)
+
     def get_instrument(self, item) -> Instrument:
         if not self.instruments_loaded:
             raise Exception("Instruments have not yet been loaded for this aggregator.")
@@ -77,11 +108,11 @@ class Aggregator:
         if not self.instruments_loaded:
             raise Exception("Instruments have not yet been loaded for this aggregator.")
 
-        if not (self.quotes_loaded and self.historicals_loaded):
-            historical_params = Instrument.historical_params(start_time, end_time)
-
+        historical_params = Instrument.historical_params(start_time, end_time)
+        if not (self.quotes_loaded and self.historicals_loaded and self.historical_params == historical_params):
             self.quotes_map, self.historicals_map = self.fetch_quotes_and_historicals(historical_params)
 
+            self.historical_params = historical_params
             self.quotes_loaded = True
             self.historicals_loaded = True
 
@@ -99,21 +130,28 @@ class Aggregator:
         return self.quotes_map
 
     def fetch_quotes_and_historicals(self, historical_params=None):
+        instruments, quotes, historicals = self.__fetch_results(self.instrument_map, historical_params)
+        quotes_map, historicals_map = self.map_results(quotes, historicals)
+        if not historical_params:
+            return quotes_map
+        return quotes_map, historicals_map
+
+    def __fetch_results(self, instrument_map, historical_params=None):
         stock_urls = set()
         option_urls = set()
 
-        for identifier in self.instrument_map:
+        for identifier in instrument_map:
             # Use the URLs only
             if identifier.startswith('http'):
                 url = identifier
-                if type(self.instrument_map[url]) == Option:
+                if type(instrument_map[url]) == Option:
                     option_urls.add(url)
                 else:
                     stock_urls.add(url)
         quote_result_set = []
         historicals_result_set = []
 
-        with thread_pool(4) as pool:
+        with thread_pool() as pool:
             if stock_urls:
                 quote_result_set.append(pool.call(Stock.Quote.search, instruments=stock_urls))
                 if historical_params:
@@ -123,34 +161,29 @@ class Aggregator:
                 if historical_params:
                     historicals_result_set.append(pool.call(Option.Historicals.search, instruments=option_urls, **historical_params))
 
+        quotes = [q for quote_set in quote_result_set for q in quote_set.get()]
+        historicals = [h for historicals_set in historicals_result_set for h in historicals_set.get()]
+        return instrument_map, quotes, historicals
+
+    def map_results(self, quotes, historicals):
         quotes_map = {}
         historicals_map = {}
 
-        for quote_set in quote_result_set:
-            quotes = quote_set.get()
-            for q in quotes:
-                instrument = self.instrument_map[q.instrument]
-                quotes_map[instrument.url] = q
-                quotes_map[instrument.identifier()] = q
+        for q in quotes:
+            instrument = self.instrument_map[q.instrument]
+            quotes_map[instrument.url] = q
+            quotes_map[instrument.identifier()] = q
+
+        for h in historicals:
+            instrument = self.instrument_map[h.instrument]
+            historicals_map[instrument.url] = h
+            historicals_map[instrument.identifier()] = h
 
         # Set extra identifiers as needed
         for identifier in self.instrument_map:
             instrument = self.instrument_map[identifier]
             if instrument.url in quotes_map:
                 quotes_map[identifier] = quotes_map[instrument.url]
-
-        if not historical_params:
-            return quotes_map
-
-        for historicals_set in historicals_result_set:
-            historicals = historicals_set.get()
-            for h in historicals:
-                instrument = self.instrument_map[h.instrument]
-                historicals_map[instrument.url] = h
-                historicals_map[instrument.identifier()] = h
-
-        for identifier in self.instrument_map:
-            instrument = self.instrument_map[identifier]
             if instrument.url in historicals_map:
                 historicals_map[identifier] = historicals_map[instrument.url]
 
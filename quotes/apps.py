@@ -1,5 +1,4 @@
 from django.apps import AppConfig
-from robinhood.models import Market
 from robinhood.api import ApiResource
 from credentials import robinhood_credentials
 import sys
@@ -14,33 +13,49 @@ def get_credential(credential_key: str) -> str:
 class QuotesConfig(AppConfig):
     name = 'quotes'
 
+    # Number of seconds after which a failed authenticator load or token refresh is retried
+    TOKEN_REFRESH_RETRY_INTERVAL = 300
+
     def ready(self):
+        # Register signal handlers invalidating cached charts
+        from quotes import chart_cache
+
+        # Stocks are catalogued in the database of this app
+        from quotes import instrument_catalog
+        from robinhood.stock_handler import StockHandler
+        StockHandler.instrument_catalog = instrument_catalog
+
         if 'test' in sys.argv:
             logger.info("Detected that we are in testing mode, enabling mocks for Robinhood API")
             ApiResource.enable_mock = True
 
         if {'runserver', 'uwsgi'}.intersection(set(sys.argv)):
-            self.preload_market_info()
+            from quotes import warmup
+            warmup.schedule()
 
         if threading.current_thread().name == 'MainThread':
-            self.run_scheduled_token_refresh_if_needed(initial_run=True)
+            # Loading the authenticator may refresh its token, so it is done in the background.
+            # Requests needing it wait a limited time for the first attempt to load it.
+            threading.Thread(target=self.run_scheduled_token_refresh_if_needed, kwargs={'initial_run': True},
+                name='authenticator', daemon=True).start()
 
     def run_scheduled_token_refresh_if_needed(self, initial_run=False):
-        authenticator = ApiResource.load_api_authenticator()
-        if authenticator:
-            interval = authenticator.refresh_interval_secs
-            if initial_run:
-                print(f"Scheduling token refresh every {interval} seconds")
+        # Both loading the authenticator and refreshing its token are retried after a failure
+        interval = self.TOKEN_REFRESH_RETRY_INTERVAL
+        try:
+            authenticator = ApiResource.load_api_authenticator()
+            if authenticator:
+                interval = authenticator.refresh_interval_secs
+                if initial_run:
+                    print(f"Scheduling token refresh every {interval} seconds")
+                else:
+                    authenticator.refresh_token_if_needed()
             else:
-                authenticator.refresh_token_if_needed()
-        
-            timer = threading.Timer(interval, self.run_scheduled_token_refresh_if_needed)
-            timer.daemon = True
-            timer.start()
-
-
-    def preload_market_info(self):
-        logger.info("Preloading market data")
-        MARKET = 'XNYS'
-        market = Market.get(MARKET)
-        market.hours()
+                logger.warning("Could not load the authenticator, retrying in {} seconds".format(interval))
+        except Exception:
+            interval = self.TOKEN_REFRESH_RETRY_INTERVAL
+            logger.exception("Could not load the authenticator or refresh its token, retrying in {} seconds".format(interval))
+
+        timer = threading.Timer(interval, self.run_scheduled_token_refresh_if_needed)
+        timer.daemon = True
+        timer.start()
@@ -0,0 +1,70 @@
+"""Naming and caching of rendered chart images.
+
+A chart's image name contains a version token identifying the period in which its data cannot change.
+While the market is closed, the token is the time the market next opens, so repeated requests for the
+same chart share one rendered image until then. While the market is open, the token changes every
+CHART_TRADING_INTERVAL seconds. The token also changes whenever a user index is modified.
+"""
+from datetime import datetime, timezone
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from time import time
+import logging
+
+from helpers.cache import Cache
+from indexes.models import Asset, Index
+from robinhood.cache_policy import market_hours_cache_policy
+
+logger = logging.getLogger('stockbot')
+
+# Default number of seconds a chart is reused for while the market is open
+DEFAULT_TRADING_INTERVAL = 60
+
+INDEXES_VERSION_KEY = 'chart_cache:indexes_version'
+
+def canonical_identifiers(identifiers: str) -> str:
+    """str: The given comma-separated identifiers, uppercased, deduplicated and sorted."""
+    # Replace slashes with hyphens for safety
+    # Slashes could be present in date-formatted string
+    identifiers = identifiers.upper().replace('/', '-')
+    return ','.join(sorted({i for i in identifiers.split(',') if i}))
+
+def img_name(identifiers: str, span: str) -> str:
+    return "{}_{}_{}".format(canonical_identifiers(identifiers), version(), span)
+
+def version() -> str:
+    """str: Token identifying the current version of all charts."""
+    next_open = _next_open()
+    if next_open:
+        token = next_open.strftime('c%Y%m%d%H%M')
+    else:
+        token = 't{}'.format(int(time() // trading_interval()))
+    return "{}v{}".format(token, indexes_version())
+
+def expires_in() -> int:
+    """int: Number of seconds until the current version of charts expires, unless a user index is modified first."""
+    next_open = _next_open()
+    if next_open:
+        return max(int((next_open - datetime.now(timezone.utc).replace(tzinfo=None)).total_seconds()), 0)
+    interval = trading_interval()
+    return int(interval - time() % interval)
+
+def _next_open():
+    try:
+        return market_hours_cache_policy.next_open()
+    except Exception as e:
+        logger.warning("Could not determine market hours for chart version: {}".format(e))
+        return None
+
+def trading_interval() -> int:
+    return getattr(settings, 'CHART_TRADING_INTERVAL', DEFAULT_TRADING_INTERVAL)
+
+def indexes_version() -> int:
+    return Cache.get(INDEXES_VERSION_KEY) or 0
+
+@receiver([post_save, post_delete], sender=Index)
+@receiver([post_save, post_delete], sender=Asset)
+def invalidate_index_charts(sender, **kwargs):
+    # Charts of user indexes must be re-rendered once their assets change
+    Cache.set(INDEXES_VERSION_KEY, indexes_version() + 1)
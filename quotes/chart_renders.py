@@ -0,0 +1,90 @@
+"""Background rendering of chart images.
+
+A render is started in the background when a chart is requested through Mattermost, so that the
+response can be sent before the image is ready. When the image is then requested, the requesting
+process waits on the render if it is running locally. If another worker process is rendering it,
+which is recorded by a pending marker in the shared cache, it waits for the image to appear in
+the chart store instead. If no render is in progress, the image is rendered in the request.
+
+Renders return the image's PNG data, which is saved to the chart store under the render's cache key.
+"""
+from django.conf import settings
+from threading import Lock
+from time import monotonic, sleep
+import logging
+import os
+
+from helpers.cache import Cache
+from helpers.pool import Task, executor
+from quotes import chart_store
+
+logger = logging.getLogger('stockbot')
+
+PENDING_SUFFIX = ':pending'
+
+# Number of seconds between checks for a render completed by another process
+POLL_INTERVAL = 0.1
+
+# Renders running in this process, by cache key
+local_renders: dict[str, Task] = {}
+local_renders_lock = Lock()
+
+if hasattr(os, 'register_at_fork'):
+    # Renders running in the parent process do not exist in the child
+    os.register_at_fork(after_in_child=local_renders.clear)
+
+def start(cache_key: str, render, *args) -> Task:
+    """Starts rendering an image in the background, unless it has already been rendered
+    or is being rendered by any process. Returns the running render, if one was started."""
+    if chart_store.get(cache_key) is not None:
+        return None
+    if not Cache.add(cache_key + PENDING_SUFFIX, os.getpid(), render_timeout()):
+        # Already being rendered
+        return None
+
+    with local_renders_lock:
+        task = executor.submit_background(_render, cache_key, render, *args)
+        if task:
+            local_renders[cache_key] = task
+    if not task:
+        # Executor is saturated; the image will be rendered when it is requested
+        Cache.delete(cache_key + PENDING_SUFFIX)
+    return task
+
+def result(cache_key: str, render, *args) -> str:
+    """str: ID of the image in the chart store, waiting for a pending render if there is one."""
+    img_id = chart_store.get(cache_key)
+    if img_id is not None:
+        return img_id
+
+    with local_renders_lock:
+        task = local_renders.get(cache_key)
+    if task:
+        return task.get()
+
+    img_id = _wait_for_other_process(cache_key)
+    if img_id is not None:
+        return img_id
+
+    return chart_store.save(cache_key, render(*args))
+
+def render_timeout():
+    return getattr(settings, 'EXECUTOR_TASK_TIMEOUT', executor.DEFAULT_TASK_TIMEOUT)
+
+def _render(cache_key, render, *args):
+    try:
+        return chart_store.save(cache_key, render(*args))
+    finally:
+        Cache.delete(cache_key + PENDING_SUFFIX)
+        with local_renders_lock:
+            local_renders.pop(cache_key, None)
+
+def _wait_for_other_process(cache_key):
+    deadline = monotonic() + render_timeout()
+    while Cache.get_shared(cache_key + PENDING_SUFFIX) is not None and monotonic() < deadline:
+        sleep(POLL_INTERVAL)
+        img_id = chart_store.get(cache_key)
+        if img_id is not None:
+            return img_id
+    # The render has failed or timed out if its image is not stored
+    return chart_store.get(cache_key)
@@ -0,0 +1,142 @@
+"""On-disk store of rendered chart images, shared by all worker processes.
+
+Each image is stored in a file named by a hash of the chart's cache key, which identifies the chart's
+inputs: its identifiers, span, options and data version. An image can therefore be found without any
+lookup. Its ETag is a hash of the image's content, kept in the shared cache, so that the same chart
+rendered again from unchanged data keeps its ETag, and a changed image never reuses one.
+
+Images are served by the web server when CHART_STORE_SENDFILE is set, using an X-Accel-Redirect
+(nginx) or X-Sendfile (Apache, lighttpd) header, or by Django through a FileResponse otherwise.
+Images older than CHART_STORE_MAX_AGE seconds are pruned; they are rendered again if requested.
+"""
+from django.conf import settings
+from django.http import FileResponse, HttpResponse
+from django.utils.cache import patch_cache_control
+from threading import Lock
+from time import time
+import hashlib
+import logging
+import os
+import tempfile
+
+from helpers.cache import Cache
+from helpers.pool import executor
+
+logger = logging.getLogger('stockbot')
+
+DEFAULT_MAX_AGE = 86400 * 4
+
+# Minimum number of seconds between prunes of the store by a process
+PRUNE_INTERVAL = 3600
+
+ETAG_KEY_PREFIX = 'chart_store:etag:'
+
+last_prune = 0
+last_prune_lock = Lock()
+
+def image_id(cache_key: str) -> str:
+    """str: Name of the stored image of a chart, given its cache key."""
+    return hashlib.sha256(cache_key.encode()).hexdigest()
+
+def etag(img_id: str) -> str:
+    """str: ETag of the stored image, a hash of its content. None if the image is not stored."""
+    digest = Cache.get(ETAG_KEY_PREFIX + img_id)
+    if digest is None:
+        # Evicted from the cache, or stored by a process which has since lost its cache
+        try:
+            with open(path(img_id), 'rb') as img_file:
+                digest = _digest(img_file.read())
+        except FileNotFoundError:
+            return None
+        Cache.set(ETAG_KEY_PREFIX + img_id, digest, max_image_age())
+    return '"{}"'.format(digest)
+
+def path(img_id: str) -> str:
+    # Spread images across subdirectories, to keep directories small
+    return os.path.join(directory(), img_id[:2], img_id + '.png')
+
+def get(cache_key: str) -> str:
+    """str: ID of the stored image for the cache key, or None if it has not been stored."""
+    img_id = image_id(cache_key)
+    if os.path.exists(path(img_id)):
+        return img_id
+    return None
+
+def save(cache_key: str, img_data: bytes) -> str:
+    """Stores the image for the cache key, returning its ID."""
+    img_id = image_id(cache_key)
+    img_path = path(img_id)
+    os.makedirs(os.path.dirname(img_path), exist_ok=True)
+    # Written to a temporary file first, so that other processes never see a partial image
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(img_path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as tmp_file:
+            tmp_file.write(img_data)
+        os.replace(tmp_path, img_path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    Cache.set(ETAG_KEY_PREFIX + img_id, _digest(img_data), max_image_age())
+    prune_if_needed()
+    return img_id
+
+def response(img_id: str, max_age: int) -> HttpResponse:
+    """HttpResponse: The stored image, sent by the web server if configured to."""
+    img_path = path(img_id)
+    sendfile = getattr(settings, 'CHART_STORE_SENDFILE', None)
+    if sendfile == 'X-Accel-Redirect':
+        response = HttpResponse(content_type='image/png')
+        response[sendfile] = getattr(settings, 'CHART_STORE_URL', '/chart-images/') + os.path.relpath(img_path, directory())
+    elif sendfile == 'X-Sendfile':
+        response = HttpResponse(content_type='image/png')
+        response[sendfile] = img_path
+    else:
+        response = FileResponse(open(img_path, 'rb'), content_type='image/png')
+    response['ETag'] = etag(img_id)
+    patch_cache_control(response, public=True, max_age=max_age)
+    return response
+
+def prune(max_age: int = None) -> int:
+    """Deletes images stored more than max_age seconds ago. Returns the number of images deleted."""
+    if max_age is None:
+        max_age = max_image_age()
+    oldest = time() - max_age
+    deleted = 0
+    for dir_entry in _scandir(directory()):
+        if not dir_entry.is_dir():
+            continue
+        for entry in _scandir(dir_entry.path):
+            try:
+                if entry.stat().st_mtime < oldest:
+                    os.unlink(entry.path)
+                    deleted += 1
+            except FileNotFoundError:
+                # Deleted by another process
+                pass
+    if deleted:
+        logger.info("Pruned {} chart images".format(deleted))
+    return deleted
+
+def prune_if_needed():
+    global last_prune
+    with last_prune_lock:
+        if time() - last_prune < PRUNE_INTERVAL:
+            return
+        last_prune = time()
+    executor.submit_background(prune)
+
+def max_image_age() -> int:
+    return getattr(settings, 'CHART_STORE_MAX_AGE', DEFAULT_MAX_AGE)
+
+def directory() -> str:
+    return getattr(settings, 'CHART_STORE_DIR', None) or os.path.join(settings.BASE_DIR, 'chart-images')
+
+def _digest(img_data: bytes) -> str:
+    return hashlib.sha256(img_data).hexdigest()
+
+def _scandir(dir_path):
+    try:
+        with os.scandir(dir_path) as entries:
+            return list(entries)
+    except FileNotFoundError:
+        return []
@@ -0,0 +1,61 @@
+"""Local catalog of Robinhood stock instruments.
+
+Instrument metadata almost never changes, so stocks found through Robinhood are stored in the
+database, and later found by symbol or ID without querying Robinhood. Entries older than
+INSTRUMENT_CATALOG_MAX_AGE seconds are ignored, and replaced once the instrument is found again.
+
+The catalog is only used when a database is configured. If the database cannot be queried,
+e.g. because its migrations have not been run, instruments are looked up in Robinhood as before.
+"""
+from datetime import timedelta
+from django.conf import settings
+from django.db import DatabaseError, connection
+from django.utils import timezone
+import logging
+
+from quotes.models import CatalogInstrument
+
+logger = logging.getLogger('stockbot')
+
+DATABASE_PRESENT = bool(connection.settings_dict['NAME'])
+
+DEFAULT_MAX_AGE = 86400 * 7
+
+UPDATE_FIELDS = ['url', 'symbol', 'simple_name', 'name', 'tradable_chain_id', 'state', 'data', 'updated_at']
+
+def find_by_ids(ids) -> dict:
+    """dict: Data of the catalogued instruments with the given IDs, by ID."""
+    entries = _find(id__in=list(ids))
+    return {str(entry.id): entry.data for entry in entries}
+
+def find_by_symbols(symbols) -> dict:
+    """dict: Data of the catalogued instruments with the given symbols, by symbol.
+    Symbols shared by several instruments, e.g. a delisted stock and a newly listed one, are left out."""
+    by_symbol = {}
+    for entry in _find(symbol__in=list(symbols)):
+        by_symbol.setdefault(entry.symbol, []).append(entry.data)
+    return {symbol: entries[0] for symbol, entries in by_symbol.items() if len(entries) == 1}
+
+def save(instruments):
+    """Adds the instruments to the catalog, replacing any existing entries for them."""
+    if not DATABASE_PRESENT or not instruments:
+        return
+    entries = [CatalogInstrument(id=i.id, url=i.url, symbol=i.symbol, simple_name=i.simple_name, name=i.name,
+        tradable_chain_id=i.tradable_chain_id, state=i.state, data=i.data) for i in instruments]
+    try:
+        CatalogInstrument.objects.bulk_create(entries, update_conflicts=True, unique_fields=['id'], update_fields=UPDATE_FIELDS)
+    except DatabaseError as e:
+        logger.warning("Could not save instruments to catalog: {}".format(e))
+
+def max_age() -> int:
+    return getattr(settings, 'INSTRUMENT_CATALOG_MAX_AGE', DEFAULT_MAX_AGE)
+
+def _find(**filters):
+    if not DATABASE_PRESENT:
+        return []
+    updated_after = timezone.now() - timedelta(seconds=max_age())
+    try:
+        return list(CatalogInstrument.objects.filter(updated_at__gte=updated_after, **filters))
+    except DatabaseError as e:
+        logger.warning("Could not read instrument catalog: {}".format(e))
+        return []
@@ -0,0 +1,59 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+import os
+import subprocess
+import sys
+
+# Imports made by a worker process before it can serve its first request
+STARTUP_SCRIPT = """
+import django, importlib
+django.setup()
+importlib.import_module({urlconf!r})
+for module in {modules!r}:
+    importlib.import_module(module)
+"""
+
+def import_times(modules=()):
+    """Imports Django, the URL configuration and any additional modules in a new Python process.
+    Returns (module, self microseconds, cumulative microseconds) for each module imported, in import order."""
+    script = STARTUP_SCRIPT.format(urlconf=settings.ROOT_URLCONF, modules=list(modules))
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', 'StockBot.settings'))
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', script],
+        cwd=settings.BASE_DIR, env=env, capture_output=True, text=True)
+    if process.returncode != 0:
+        raise CommandError("Startup failed:\n{}".format(process.stderr))
+
+    times = []
+    for line in process.stderr.splitlines():
+        # Lines are formatted as 'import time: <self> | <cumulative> | <module>', after a header line
+        if not line.startswith('import time:'):
+            continue
+        self_us, cumulative_us, module = line[len('import time:'):].split('|')
+        if not self_us.strip().isdigit():
+            continue
+        times.append((module.strip(), int(self_us), int(cumulative_us)))
+    return times
+
+class Command(BaseCommand):
+    help = "Reports the time taken by each module imported when a worker process starts"
+
+    def add_arguments(self, parser):
+        parser.add_argument('modules', nargs='*',
+            help="Additional modules to import after the URL configuration")
+        parser.add_argument('--limit', type=int, default=20,
+            help="Number of modules to list, slowest first")
+        parser.add_argument('--budget', type=float,
+            help="Maximum total import time in milliseconds; the command fails if it is exceeded")
+
+    def handle(self, *args, **options):
+        times = import_times(options['modules'])
+        total_ms = sum(self_us for _, self_us, _ in times) / 1000
+
+        self.stdout.write("{:>10} {:>12}  {}".format('self (ms)', 'total (ms)', 'module'))
+        for module, self_us, cumulative_us in sorted(times, key=lambda t: t[1], reverse=True)[:options['limit']]:
+            self.stdout.write("{:>10.1f} {:>12.1f}  {}".format(self_us / 1000, cumulative_us / 1000, module))
+        self.stdout.write("Imported {} modules in {:.1f} ms".format(len(times), total_ms))
+
+        budget = options['budget']
+        if budget is not None and total_ms > budget:
+            raise CommandError("Import time of {:.1f} ms exceeds the budget of {:.1f} ms".format(total_ms, budget))
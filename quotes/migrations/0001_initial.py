@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogInstrument',
+            fields=[
+                ('id', models.UUIDField(primary_key=True, serialize=False)),
+                ('url', models.CharField(max_length=160)),
+                ('symbol', models.CharField(db_index=True, max_length=16)),
+                ('simple_name', models.CharField(max_length=256, null=True)),
+                ('name', models.CharField(max_length=256, null=True)),
+                ('tradable_chain_id', models.CharField(max_length=64, null=True)),
+                ('state', models.CharField(max_length=32, null=True)),
+                ('data', models.JSONField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+from django.db import models
+
+class CatalogInstrument(models.Model):
+    """Metadata of a Robinhood stock instrument, kept locally so that instruments can be found
+    by symbol or ID without querying Robinhood. See `quotes.instrument_catalog`."""
+    id = models.UUIDField(primary_key=True)
+    url = models.CharField(max_length=160)
+    symbol = models.CharField(max_length=16, db_index=True)
+    simple_name = models.CharField(max_length=256, null=True)
+    name = models.CharField(max_length=256, null=True)
+    tradable_chain_id = models.CharField(max_length=64, null=True)
+    state = models.CharField(max_length=32, null=True)
+    # Full instrument data as returned by Robinhood
+    data = models.JSONField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.symbol
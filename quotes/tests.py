@@ -5,6 +5,29 @@ from indexes.models import Asset, Index, User
 from robinhood.stock_handler import StockHandler
 from robinhood.option_handler import OptionHandler
 from helpers.test_helpers import *
+from quotes import chart_cache, chart_renders, chart_store, instrument_catalog, warmup
+from quotes.models import CatalogInstrument
+from django.db import DatabaseError
+from quotes.management.commands import startup_profile
+from chart import chart_builder
+from chart.render_pool import ChartSpec, RenderPool
+from chart.chart_data import ChartData
+from chart.downsample import lttb
+from chart.chart import Chart
+from types import SimpleNamespace
+import numpy as np
+from multiprocessing import shared_memory
+from django.test import override_settings
+from helpers.pool import executor
+import sys
+from helpers.cache import Cache
+from threading import Thread
+from time import sleep, time
+import os
+import hashlib
+from robinhood.cache_policy import market_hours_cache_policy
+from unittest.mock import patch
+from datetime import datetime, timedelta
 
 class QuotesTestCase(TestCase):
 
@@ -23,6 +46,29 @@ class QuotesTestCase(TestCase):
         response = self.client.get('/quotes/view/' + stock_id)
         self.assertEqual(200, response.status_code)
 
+    def test_stock_chart_image(self):
+        stock_id = 'FAKE'
+        mock_stock_workflow(stock_id)
+        img_name = chart_cache.img_name(stock_id, 'day')
+        response = self.client.get('/quotes/image/{}.png'.format(img_name))
+        self.assertEqual(200, response.status_code)
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'\x89PNG'))
+        self.assertEqual(chart_store.etag(chart_store.get(img_name)), response['ETag'])
+
+    def test_chart_not_modified(self):
+        stock_id = 'FAKE'
+        mock_stock_workflow(stock_id)
+        for url in ['/quotes/view/' + stock_id, '/quotes/image/{}.png'.format(chart_cache.img_name(stock_id, 'day'))]:
+            response = self.client.get(url)
+            self.assertEqual(200, response.status_code)
+            etag = response['ETag']
+            with patch('quotes.views.chart_renders.result') as result:
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            result.assert_not_called()
+            self.assertEqual(304, response.status_code)
+            self.assertEqual(etag, response['ETag'])
+            self.assertIn('max-age', response['Cache-Control'])
+
     def test_option_quote(self):
         option_id = 'FAKE10P12-21'
         mock_option_workflow(option_id)
@@ -118,6 +164,18 @@ class AggregatorTestCase(TestCase):
         quotes = aggregator.quotes()
         self.check_all_present(quotes, index.assets())
 
+    def test_market_data_loaded_with_instruments(self):
+        end_time = datetime.now()
+        start_time = end_time - timedelta(hours=6)
+        aggregator = Aggregator()
+        aggregator.load_instruments(*self.identifiers, historical_params=Instrument.historical_params(start_time, end_time))
+        with patch.object(Stock.Quote, 'search') as quote_search, patch.object(Stock.Historicals, 'search') as historicals_search:
+            quotes, historicals = aggregator.quotes_and_historicals(start_time, end_time)
+        quote_search.assert_not_called()
+        historicals_search.assert_not_called()
+        self.check_all_present(quotes, self.identifiers)
+        self.check_all_present(historicals, self.identifiers)
+
     def check_all_present(self, results, items):
         identifiers = set()
         for i in items:
@@ -127,3 +185,232 @@ class AggregatorTestCase(TestCase):
             self.assertTrue(identifier in results)
             instrument = self.instruments[identifier]
             self.assertTrue(results[identifier].instrument == instrument.url)
+
+class InstrumentCatalogTestCase(TestCase):
+
+    def setUp(self):
+        ApiResource.enable_mock = True
+        mock_stock_workflow('FAKE')
+
+    def test_instruments_found_in_catalog(self):
+        # The catalog is filled with instruments retrieved from Robinhood
+        Cache.delete(Stock.search_url(symbol='FAKE'))
+        stock = StockHandler().find_instruments('FAKE')['FAKE']
+        # Neither the cache nor Robinhood are needed once the instrument is in the catalog
+        with patch('robinhood.instrument_handler.Cache.get', return_value=None), \
+                patch.object(Stock, 'search', side_effect=AssertionError("Robinhood was queried")):
+            by_symbol = StockHandler().find_instruments('FAKE')
+            by_url = StockHandler().find_instruments(stock.url)
+        self.assertEqual(stock.id, by_symbol['FAKE'].id)
+        self.assertEqual(stock.id, by_url[stock.url].id)
+
+    def test_database_errors_are_ignored(self):
+        StockHandler().find_instruments('FAKE')
+        with patch.object(CatalogInstrument.objects, 'filter', side_effect=DatabaseError("no such table")):
+            self.assertEqual({}, instrument_catalog.find_by_symbols(['FAKE']))
+
+class ChartCacheTestCase(TestCase):
+
+    def test_canonical_identifiers(self):
+        self.assertEqual('AMZN,FAKE1-1-2021', chart_cache.canonical_identifiers('fake1/1/2021,AMZN,amzn'))
+
+    def test_img_name_is_stable_while_closed(self):
+        with patch.object(market_hours_cache_policy, 'next_open', return_value=datetime(2024, 1, 8, 13)):
+            img_name = chart_cache.img_name('AMZN,AAPL', 'day')
+            self.assertEqual(img_name, chart_cache.img_name('aapl,amzn', 'day'))
+        self.assertTrue(img_name.startswith('AAPL,AMZN_c202401081300'))
+
+    def test_index_changes_invalidate_charts(self):
+        with patch.object(market_hours_cache_policy, 'next_open', return_value=datetime(2024, 1, 8, 13)):
+            img_name = chart_cache.img_name('TEST', 'day')
+            user = User.objects.create(id='testuser')
+            Index.objects.create(user=user, name='TEST')
+            self.assertNotEqual(img_name, chart_cache.img_name('TEST', 'day'))
+
+class ChartRendersTestCase(TestCase):
+
+    def setUp(self):
+        self.renders = []
+
+    def render(self, name):
+        self.renders.append(name)
+        return name.encode()
+
+    def stored_image(self, img_id):
+        with open(chart_store.path(img_id), 'rb') as img_file:
+            return img_file.read()
+
+    def test_background_render_is_reused(self):
+        task = chart_renders.start('test_render_reused', self.render, 'chart')
+        self.assertIsNotNone(task)
+        img_id = chart_renders.result('test_render_reused', self.render, 'chart')
+        self.assertEqual(b'chart', self.stored_image(img_id))
+        self.assertEqual(['chart'], self.renders)
+        self.assertIsNone(chart_renders.start('test_render_reused', self.render, 'chart'))
+
+    def test_waits_for_render_in_other_process(self):
+        cache_key = 'test_render_other_process'
+        Cache.add(cache_key + chart_renders.PENDING_SUFFIX, -1, 60)
+
+        def finish_render():
+            sleep(0.2)
+            chart_store.save(cache_key, b'other')
+            Cache.delete(cache_key + chart_renders.PENDING_SUFFIX)
+        Thread(target=finish_render).start()
+
+        img_id = chart_renders.result(cache_key, self.render, 'chart')
+        self.assertEqual(b'other', self.stored_image(img_id))
+        self.assertEqual([], self.renders)
+
+class ChartStoreTestCase(TestCase):
+
+    def test_response(self):
+        img_id = chart_store.save('test_store_response', b'image')
+        response = chart_store.response(img_id, max_age=60)
+        self.assertEqual(b'image', b''.join(response.streaming_content))
+        self.assertEqual('"{}"'.format(hashlib.sha256(b'image').hexdigest()), response['ETag'])
+        self.assertIn('max-age=60', response['Cache-Control'])
+
+        with override_settings(CHART_STORE_SENDFILE='X-Accel-Redirect'):
+            response = chart_store.response(img_id, max_age=60)
+        self.assertEqual(b'', response.content)
+        self.assertEqual('/chart-images/{}/{}.png'.format(img_id[:2], img_id), response['X-Accel-Redirect'])
+
+    def test_etag_follows_content(self):
+        img_id = chart_store.save('test_store_etag', b'image')
+        # The same image under another version of the chart keeps its ETag
+        self.assertEqual(chart_store.etag(img_id), chart_store.etag(chart_store.save('test_store_etag_next', b'image')))
+        # A changed image does not, even when its ETag is no longer cached
+        chart_store.save('test_store_etag', b'changed')
+        Cache.delete(chart_store.ETAG_KEY_PREFIX + img_id)
+        self.assertEqual('"{}"'.format(hashlib.sha256(b'changed').hexdigest()), chart_store.etag(img_id))
+
+    def test_prune(self):
+        img_id = chart_store.save('test_store_prune', b'image')
+        old = time() - chart_store.max_image_age() - 1
+        os.utime(chart_store.path(img_id), (old, old))
+        chart_store.save('test_store_kept', b'image')
+        self.assertEqual(1, chart_store.prune())
+        self.assertIsNone(chart_store.get('test_store_prune'))
+        self.assertIsNotNone(chart_store.get('test_store_kept'))
+
+class ChartRenderingTestCase(TestCase):
+
+    def setUp(self):
+        ApiResource.enable_mock = True
+        mock_market()
+        mock_stock_workflow('FAKEA')
+        mock_stock_workflow('FAKEB')
+
+    def test_parallel_renders(self):
+        tasks = [executor.submit(chart_builder.build_chart, identifiers) for identifiers in ['FAKEA', 'FAKEB', 'FAKEA']]
+        for task in tasks:
+            self.assertTrue(task.get().get_img_data().startswith(b'\x89PNG'))
+        # Charts do not register their figures with pyplot
+        self.assertNotIn('matplotlib.pyplot', sys.modules)
+
+    def test_background_reused(self):
+        Chart.backgrounds.clear()
+        chart_spec = chart_builder.prepare_chart('FAKEA')
+        for _ in range(2):
+            self.assertTrue(chart_spec.render().startswith(b'\x89PNG'))
+        self.assertEqual({'hits': 1, 'misses': 1, 'layers': 1}, Chart.backgrounds.stats())
+        # A background cannot be modified by the charts sharing it
+        image = next(iter(Chart.backgrounds.layers.values()))[0]
+        self.assertFalse(image.flags.writeable)
+
+class WarmUpTestCase(TestCase):
+
+    def setUp(self):
+        ApiResource.enable_mock = True
+        mock_market()
+
+    def test_warm_up(self):
+        Chart.backgrounds.clear()
+        with self.assertNoLogs('stockbot', level='ERROR'):
+            durations = warmup.warm_up()
+        self.assertEqual({'chart', 'market'}, set(durations))
+        self.assertEqual(1, Chart.backgrounds.stats()['layers'])
+
+class StartupProfileTestCase(TestCase):
+
+    def test_chart_stack_not_imported_at_startup(self):
+        modules = {module for module, _, _ in startup_profile.import_times()}
+        self.assertIn('quotes.views', modules)
+        for module in ('matplotlib', 'pandas', 'chart.chart'):
+            self.assertNotIn(module, modules)
+
+class RenderPoolTestCase(TestCase):
+
+    def setUp(self):
+        ApiResource.enable_mock = True
+        mock_market()
+        mock_stock_workflow('FAKEA')
+
+    def test_pack_and_unpack(self):
+        chart_spec = chart_builder.prepare_chart('FAKEA')
+        size, definition = chart_spec.pack()
+        shm = shared_memory.SharedMemory(create=True, size=size)
+        try:
+            chart_spec.pack(shm)
+            unpacked = ChartSpec.unpack(shm, definition)
+        finally:
+            shm.close()
+            shm.unlink()
+        original_series = chart_spec.chart_data_sets[0].series
+        unpacked_series = unpacked.chart_data_sets[0].series
+        self.assertTrue((original_series.values == unpacked_series.values).all())
+        self.assertTrue((original_series.index == unpacked_series.index).all())
+        self.assertEqual(chart_spec.market_hours.extended_closes_at, unpacked.market_hours.extended_closes_at)
+
+    @override_settings(CHART_RENDER_PROCESSES=1)
+    def test_render_in_process_pool(self):
+        pool = RenderPool()
+        try:
+            img_data = pool.render(chart_builder.prepare_chart('FAKEA'))
+        finally:
+            pool.shutdown()
+        self.assertTrue(img_data.startswith(b'\x89PNG'))
+        self.assertEqual(1, pool.stats()['completed'])
+
+class ChartDataTestCase(TestCase):
+
+    def test_assets_are_aligned_on_time_grid(self):
+        start = datetime(2024, 1, 2, 14, 30)
+        times = [start + timedelta(minutes=5 * i) for i in range(4)]
+        historicals = {
+            'a': self.historicals(times, [10, 11, 12, 13]),
+            # Missing the second and last data points
+            'b': self.historicals([times[0], times[2]], [100, 102])
+        }
+        assets = [self.asset('a', 2), self.asset('b', 1)]
+
+        chart_data = ChartData('TEST', 'TEST', assets)
+        chart_data.load({}, historicals, times[0], times[-1])
+
+        self.assertEqual(times, list(chart_data.series.index))
+        self.assertEqual([120, 122, 126, 128], list(chart_data.series.values))
+
+    def historicals(self, times, prices):
+        columns = HistoricalColumns(np.array(times, dtype='datetime64[us]'), np.array(prices, dtype=np.float64),
+            np.array(prices, dtype=np.float64), np.zeros(len(times), dtype=bool))
+        return SimpleNamespace(columns=lambda: columns, previous_close_price=None)
+
+    def asset(self, instrument_url, count):
+        return Asset(instrument_url=instrument_url, identifier=instrument_url, count=count, type=Asset.STOCK)
+
+class DownsampleTestCase(TestCase):
+
+    def test_lttb_keeps_extremes(self):
+        x = np.arange(10000)
+        y = np.sin(x / 500)
+        y[4321] = 10
+        indices = lttb(x, y, 700)
+        self.assertEqual(700, len(indices))
+        self.assertEqual(0, indices[0])
+        self.assertEqual(9999, indices[-1])
+        self.assertIn(4321, indices)
+        self.assertTrue((np.diff(indices) > 0).all())
+
+    def test_lttb_keeps_short_lines(self):
+        self.assertEqual([0, 1, 2], list(lttb(np.arange(3), np.zeros(3), 700)))
@@ -1,14 +1,13 @@
 from typing import Any
-from django.core.cache import cache
 from django.urls import reverse
 from django.http import HttpRequest, HttpResponse
 from django.conf import settings
+from django.utils.cache import get_conditional_response, patch_cache_control
 
 from robinhood.models import Stock
 from helpers.utilities import mattermost_text
-from chart import chart_builder
+from quotes import chart_cache, chart_renders, chart_store
 
-from datetime import datetime
 import json
 import re
 
@@ -18,26 +17,61 @@ from exceptions import BadRequestException
 
 MARKET = 'XNYS'
 
+# Default number of seconds to wait for a chart to render before replying to Mattermost.
+# If the chart is not ready by then, it continues rendering in the background.
+DEFAULT_CHART_RENDER_WAIT = 2
+
+# Default maximum number of seconds clients may reuse a chart from /view for without revalidating it
+DEFAULT_CHART_VIEW_MAX_AGE = 3600
+
 DATABASE_PRESENT = bool(connection.settings_dict['NAME'])
 
 def get_chart(request, identifiers: list, span = 'day'):
-    chart = chart_builder.build_chart(identifiers, span, split=bool_param(request, 'split'))
-    return HttpResponse(chart.get_img_data(), content_type="image/png")
+    ids = chart_cache.canonical_identifiers(identifiers)
+    cache_key = get_cache_key(chart_cache.img_name(ids, span), request)
+    # The chart may change once its version expires, or earlier if a user index is modified
+    max_age = min(chart_cache.expires_in(), getattr(settings, 'CHART_VIEW_MAX_AGE', DEFAULT_CHART_VIEW_MAX_AGE))
+    return chart_img_response(request, cache_key, max_age, ids, span)
+
+def render_chart(identifiers: str, span: str, split: bool) -> bytes:
+    # Imported here so that only chart requests load pandas and matplotlib
+    from chart import chart_builder
+    return chart_builder.build_chart_img(identifiers, span, split=split)
 
 def get_chart_img(request: HttpRequest, img_name: str):
     cache_key = get_cache_key(img_name, request)
-    if cache.has_key(cache_key):
-        return cache.get(cache_key)
+    identifiers, span = parse_img_name(img_name)
+    # An image name includes the version of the chart's data, so its image rarely changes
+    return chart_img_response(request, cache_key, chart_store.max_image_age(), identifiers, span)
+
+def chart_img_response(request: HttpRequest, cache_key: str, max_age: int, identifiers: str, span: str):
+    # A client which already has the stored image is answered without rendering or reading the image
+    img_id = chart_store.get(cache_key)
+    if img_id is None:
+        # Wait for the image if it is being rendered in the background
+        img_id = chart_renders.result(cache_key, render_chart, identifiers, span, bool_param(request, 'split'))
+    etag = chart_store.etag(img_id)
+    # A chart rendered again from unchanged data has the same ETag, and is not sent again either
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        return chart_store.response(img_id, max_age)
+    response['ETag'] = etag
+    patch_cache_control(response, public=True, max_age=max_age)
+    return response
+
+def start_chart_img(request: HttpRequest, img_name: str):
+    cache_key = get_cache_key(img_name, request)
+    identifiers, span = parse_img_name(img_name)
+    task = chart_renders.start(cache_key, render_chart, identifiers, span, bool_param(request, 'split'))
+    # Wait briefly, so that errors such as invalid identifiers are still reported back to the user
+    if task and task.wait(getattr(settings, 'CHART_RENDER_WAIT', DEFAULT_CHART_RENDER_WAIT)):
+        task.get()
 
+def parse_img_name(img_name: str):
     parts = img_name.split("_")
     if len(parts) < 3:
         raise BadRequestException("Invalid image: '{}'".format(img_name))
-    identifiers = parts[0]
-    span = parts[-1]
-
-    response = get_chart(request, identifiers, span)
-    cache.set(cache_key, response)
-    return response
+    return parts[0], parts[-1]
 
 def get_cache_key(img_name: str, request: HttpRequest):
     key = img_name
@@ -90,18 +124,15 @@ def build_stockbot_url(request: HttpRequest, uri: str):
     return url
 
 def mattermost_chart(request: HttpRequest, identifiers: list, span: str):
-    ids = identifiers.upper()
-    # Replace slashes with hyphens for safety
-    # Slashes could be present in date-formatted string
-    ids = ids.replace('/', '-')
+    ids = chart_cache.canonical_identifiers(identifiers)
     chart_name = ', '.join([identifiers])
 
-    # Add a timestamp to the image name to avoid caching future charts
-    timestamp = datetime.now().strftime("%H%M%S")
-    img_file_name = "{}_{}_{}".format(ids, timestamp, span)
+    # The image name only changes when the chart's data may have changed,
+    # so repeated requests for the same chart reuse the cached image
+    img_file_name = chart_cache.img_name(ids, span)
 
-    # Generate the image and cache it in advance
-    get_chart_img(request, img_file_name)
+    # Start generating the image in advance, it is served once Mattermost requests it
+    start_chart_img(request, img_file_name)
 
     url_params = ''
     if bool_param(request, 'split'):
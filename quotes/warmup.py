@@ -0,0 +1,86 @@
+"""Warm-up of new worker processes.
+
+The first chart requested from a new worker process would otherwise pay for importing pandas and
+matplotlib, loading matplotlib's font cache, looking up the market's hours and opening a connection
+to Robinhood. Warming up does all of this in the background as soon as the process starts, so the
+first requests after a deploy or worker restart are as fast as any other.
+"""
+from datetime import datetime, timedelta
+from threading import Thread
+from time import monotonic
+from types import SimpleNamespace
+from django.conf import settings
+import logging
+
+logger = logging.getLogger('stockbot')
+
+WARM_UP_MARKET = 'XNYS'
+
+def schedule():
+    """Warms up this process in the background.
+    When running under uwsgi, each worker process is warmed up once it has been forked instead."""
+    if not getattr(settings, 'WORKER_WARM_UP', True):
+        return
+    try:
+        from uwsgidecorators import postfork
+    except ImportError:
+        start()
+    else:
+        postfork(start)
+
+def start() -> Thread:
+    thread = Thread(target=warm_up, name='warm-up', daemon=True)
+    thread.start()
+    return thread
+
+def warm_up():
+    """Runs each warm-up step, logging how long they took.
+    Returns the number of seconds taken by each step."""
+    durations = {}
+    started_at = monotonic()
+    for name, step in (('chart', warm_up_chart), ('market', warm_up_market)):
+        step_started_at = monotonic()
+        try:
+            step()
+        except Exception:
+            # Warming up is only an optimization, the step will be done by the first request needing it
+            logger.exception("Warm-up step '{}' failed".format(name))
+        durations[name] = monotonic() - step_started_at
+
+    logger.info("Warm-up finished in {:.2f}s ({})".format(monotonic() - started_at,
+        ', '.join('{} {:.2f}s'.format(name, secs) for name, secs in durations.items())))
+    return durations
+
+def warm_up_chart():
+    """Renders a chart of made up data, then starts the chart render processes if they are enabled."""
+    import numpy as np
+    import pandas as pd
+    from pytz import timezone
+    # Also imports the modules needed to build charts from Robinhood data
+    from chart import chart_builder
+    from chart.chart_data import ChartData
+    from chart.render_pool import ChartSpec, render_pool
+
+    market_timezone = timezone('US/Eastern')
+    # Market hours are naive UTC times, like those returned by Robinhood
+    opens_at = datetime.now().replace(hour=13, minute=30, second=0, microsecond=0)
+    market_hours = SimpleNamespace(opens_at=opens_at, closes_at=opens_at + timedelta(hours=6, minutes=30),
+        extended_opens_at=opens_at - timedelta(hours=2, minutes=30), extended_closes_at=opens_at + timedelta(hours=10, minutes=30),
+        is_open=True)
+
+    chart_data = ChartData('Warm-up', 'WARMUP', [])
+    times = pd.date_range(market_hours.extended_opens_at, market_hours.extended_closes_at, freq='5min')
+    chart_data.series = pd.Series(100 + np.sin(np.linspace(0, 2 * np.pi, len(times))), index=times)
+    chart_data.reference_price = 100
+    chart_data.current_price = chart_data.series.iloc[-1]
+
+    ChartSpec('Warm-up', timedelta(days=1), market_timezone, market_hours, False, [chart_data], True).render()
+    render_pool.start()
+
+def warm_up_market():
+    """Caches the market's hours, opening a connection to Robinhood in the process."""
+    from robinhood.models import Market
+    from robinhood.cache_policy import market_hours_cache_policy
+
+    Market.get(WARM_UP_MARKET).hours()
+    market_hours_cache_policy.next_open()
@@ -1,5 +1,5 @@
 import requests
-from datetime import date, datetime, timedelta
+from datetime import date, datetime, timedelta, timezone
 from dateutil import parser as dateparser
 import pytz
 import re
@@ -10,18 +10,85 @@ import hashlib
 import logging
 from time import time
 from helpers.cache import Cache
+from helpers.single_flight import SingleFlight
+from helpers.pool import executor
 import inspect
 from exceptions import NotFoundException
 from requests import Response
-from robinhood.auth.authenticator import load_authenticator_instance
+from robinhood.auth.authenticator import load_authenticator_instance, wait_for_authenticator
+from robinhood.transport import transport
 
 ROBINHOOD_ENDPOINT = 'https://api.robinhood.com'
 
 logger = logging.getLogger('stockbot')
 
-class ApiModel():
+class ApiModelType(type):
+    """Metaclass for API models.
+
+    Compiles a decoder for the `attributes` of each model class once, when the class is created,
+    rather than inspecting every attribute's type each time an object is constructed.
+    Also generates `__slots__` for each attribute, so that model objects do not need an instance dict.
+    """
+    def __new__(mcs, name, bases, namespace):
+        if '__slots__' not in namespace:
+            namespace['__slots__'] = ApiModelType.__slots_for(bases, namespace)
+        cls = super().__new__(mcs, name, bases, namespace)
+        cls._decode = ApiModelType.__compile_decoder(cls)
+        return cls
+
+    def __slots_for(bases, namespace):
+        attributes = namespace.get('attributes')
+        if attributes is None:
+            # Attributes are inherited, so are their slots
+            return ()
+
+        inherited_slots = set()
+        for base in bases:
+            for c in base.__mro__:
+                inherited_slots.update(c.__dict__.get('__slots__', ()))
+                if '__dict__' in c.__dict__:
+                    inherited_slots.add('__dict__')
+
+        slots = []
+        for attr in attributes:
+            if attr in inherited_slots:
+                continue
+            if attr in namespace or not attr.isidentifier():
+                # Cannot define a slot with the same name as a class variable.
+                # Fall back to storing these attributes in an instance dict.
+                if '__dict__' not in inherited_slots and '__dict__' not in slots:
+                    slots.append('__dict__')
+                continue
+            slots.append(attr)
+        return tuple(slots)
+
+    def __compile_decoder(cls):
+        """Generates a function which assigns every attribute of a new object from its raw data.
+        Missing attributes are set to None."""
+        decoders = {}
+        lines = ['def decode(self, data):', '    get = data.get']
+        for i, attr in enumerate(cls.attributes):
+            decoder = attribute_decoder(cls, cls.attributes[attr])
+            value = "get({!r})".format(attr)
+            if decoder:
+                decoder_name = "decoder_{}".format(i)
+                decoders[decoder_name] = decoder
+                lines.append("    val = {}".format(value))
+                value = "None if val is None else {}(val)".format(decoder_name)
+            if attr.isidentifier() and attr not in cls.__dict__:
+                lines.append("    self.{} = {}".format(attr, value))
+            else:
+                lines.append("    setattr(self, {!r}, {})".format(attr, value))
+        if not cls.attributes:
+            lines.append('    pass')
+
+        exec('\n'.join(lines), decoders)
+        return decoders['decode']
+
+class ApiModel(metaclass=ApiModelType):
+    __slots__ = ('data', '_items')
+
     attributes = {}
-    data = {}
 
     # Flag indicating a type reference to the current class
     class CurrentClass():
@@ -30,28 +97,24 @@ class ApiModel():
 
     def __init__(self, **data):
         self.data = data
-        self.__assign_attributes(data)
+        self._items = data.get('items')
+        self._decode(data)
+
+    @property
+    def items(self):
+        """list: Items of a listable class. These are only constructed from the raw data when first accessed."""
+        if self._items is None:
+            # Raises an AttributeError if this is not a listable item class
+            list_key = self.__class__.Item.list_key
+            if list_key not in self.data:
+                raise AttributeError("'{}' object has no items".format(self.__class__.__name__))
+            item_class = self.__class__.Item
+            self._items = [item_class(**item) for item in self.data[list_key]]
+        return self._items
 
-    def __assign_attributes(self, data):
-        for attr in self.attributes:
-            if attr in data:
-                val = self.__typed_attribute(attr, data[attr])
-                setattr(self, attr, val)
-            elif attr not in locals():
-                # Initialize all missing attributes as None
-                setattr(self, attr, None)
-        # Load variables for list items if they exist
-        if 'items' in data:
-            self.items = data['items']
-        else:
-            try:
-                item_class = self.__class__.Item
-                list_key = item_class.list_key
-                if list_key in data:
-                    self.items = [item_class(**item) for item in data[list_key]]
-            except AttributeError:
-                # Not a listable item class
-                pass
+    @items.setter
+    def items(self, items):
+        self._items = items
 
     def raw_data(self):
         data = {}
@@ -59,7 +122,7 @@ class ApiModel():
             val = getattr(self, attr)
             if val is not None:
                 attr_type = self.attributes[attr]
-                if val and type(attr_type) == type and issubclass(attr_type, ApiModel):
+                if val and inspect.isclass(attr_type) and issubclass(attr_type, ApiModel):
                     if inspect.isclass(val):
                         val = val.raw_data()
                     else:
@@ -81,45 +144,69 @@ class ApiModel():
             pass
         return data
 
-    def __typed_attribute(self, attr, val):
-        if val == None:
-            return val
-        attr_type = self.attributes[attr]
-        if attr_type == None:
-            return val
-        elif attr_type == date:
-            if type(val) is str:
-                val = dateparser.parse(val).date()
-            elif type(val) is datetime:
-                val = val.date()
-            elif type(val) is not date:
-                raise ValueError(f"Cannot extract date from value of type '{type(val)}'")
-            return val
-        elif attr_type == datetime:
-            if type(val) in [int, float]:
-                val = datetime.fromtimestamp(val)
-            elif type(val) is str:
-                val = dateparser.parse(val).astimezone(pytz.utc).replace(tzinfo=None)
-            elif type(val) is not datetime:
-                raise ValueError(f"Cannot extract datetime from value of type '{type(val)}'")
-            return val
-        elif attr_type == bool:
-            return val in [True, 'true', 'True', 't', 1]
-        elif type(attr_type) == type and issubclass(attr_type, ApiModel) or attr_type == self.__class__.CurrentClass:
-            # Value is a URL pointing to another resource.
-            # Create a method for retrieving the object
-            if attr_type == self.__class__.CurrentClass:
-                # CurrentClass is just a flag; the actual class is the current calling class
-                attr_type = self.__class__
-
-            def resource_function():
-                return attr_type(**attr_type.request(val))
-            return resource_function
-        else:
+def attribute_decoder(model_class, attr_type):
+    """function: Returns a function which converts a raw (non-null) value into the given attribute type,
+    or None if the value should be used as-is."""
+    if attr_type == None:
+        return None
+    elif attr_type == date:
+        return decode_date
+    elif attr_type == datetime:
+        return decode_datetime
+    elif attr_type == bool:
+        return decode_bool
+    elif attr_type == ApiModel.CurrentClass or inspect.isclass(attr_type) and issubclass(attr_type, ApiModel):
+        if attr_type == ApiModel.CurrentClass:
+            # CurrentClass is just a flag; the actual class is the class being decoded
+            attr_type = model_class
+        return resource_loader(attr_type)
+    else:
+        def decode_type(val):
             try:
                 return attr_type(val)
             except TypeError:
                 raise Exception(f"Could not cast value as {attr_type}: {val}")
+        return decode_type
+
+def decode_date(val):
+    if type(val) is str:
+        try:
+            return date.fromisoformat(val)
+        except ValueError:
+            return dateparser.parse(val).date()
+    elif type(val) is datetime:
+        return val.date()
+    elif type(val) is not date:
+        raise ValueError(f"Cannot extract date from value of type '{type(val)}'")
+    return val
+
+def decode_datetime(val):
+    if type(val) is str:
+        # Robinhood returns ISO-8601 timestamps, which can be parsed much faster than with dateutil
+        try:
+            val = datetime.fromisoformat(val)
+        except ValueError:
+            val = dateparser.parse(val)
+        if val.tzinfo is timezone.utc:
+            return val.replace(tzinfo=None)
+        return val.astimezone(pytz.utc).replace(tzinfo=None)
+    elif type(val) in [int, float]:
+        return datetime.fromtimestamp(val)
+    elif type(val) is not datetime:
+        raise ValueError(f"Cannot extract datetime from value of type '{type(val)}'")
+    return val
+
+def decode_bool(val):
+    return val in [True, 'true', 'True', 't', 1]
+
+def resource_loader(resource_class):
+    # Value is a URL pointing to another resource.
+    # Create a method for retrieving the object
+    def decode_resource(val):
+        def resource_function():
+            return resource_class(**resource_class.request(val))
+        return resource_function
+    return decode_resource
 
 class ApiCallException(Exception):
     code = None
@@ -164,21 +251,53 @@ class ApiResource(ApiModel):
     authenticator = None
 
     enable_cache = True
+    # Number of seconds a cached response is considered fresh for
     cache_timeout = None
+    # Optional number of seconds a cached response is kept for in total.
+    # Once cache_timeout has passed, the stale response is still served immediately
+    # while it is refreshed in the background. The stale response is also served
+    # when Robinhood is returning errors or cannot be reached.
+    cache_hard_timeout = None
+    # Optional TimeoutPolicy applied to the timeouts above when caching a response,
+    # e.g. to keep market data cached for longer while the market is closed
+    cache_policy = None
+
+    # Maximum length of a search request URL. Searches for longer lists of items are split into
+    # several requests, since Robinhood and proxies in front of it reject overly long URLs.
+    max_url_length = 2000
 
     enable_mock = False
     mock_results = {}
 
-    ROBINHOOD_AUTHENTICATOR = None
+    # Tracks requests currently being made to Robinhood, shared by all resources
+    in_flight_requests = SingleFlight()
+
+    # Request URLs of stale cached responses currently being refreshed in the background
+    refreshing_urls = set()
+    refreshing_urls_lock = RLock()
+
+    # Number of seconds an authenticated request waits for the authenticator to be loaded at startup
+    authenticator_timeout = 10
 
     @staticmethod
     def load_api_authenticator():
-        global ROBINHOOD_AUTHENTICATOR
-        ROBINHOOD_AUTHENTICATOR = load_authenticator_instance()
-        return ROBINHOOD_AUTHENTICATOR
+        return load_authenticator_instance()
 
     @classmethod
     def search(cls, **params):
+        chunks = cls.__chunk_params(params)
+        if len(chunks) == 1:
+            return cls.__search(**params)
+
+        # Search for each chunk concurrently, and merge their results
+        tasks = [executor.submit(cls.__search, **chunk) for chunk in chunks]
+        results = []
+        for task in tasks:
+            results.extend(task.get())
+        return results
+
+    @classmethod
+    def __search(cls, **params):
         results = []
         data = cls.request(cls.resource_url(), **params)
         while data and 'results' in data:
@@ -191,6 +310,42 @@ class ApiResource(ApiModel):
                 break
         return results
 
+    @classmethod
+    def __chunk_params(cls, params):
+        """list: The search parameters split into chunks whose request URLs fit within max_url_length.
+        The longest list parameter is split by the hash of each value rather than by position,
+        so that lists sharing most of their values, e.g. an index before and after an asset is added,
+        are split into mostly the same chunks, and the cached responses of those chunks are reused."""
+        list_keys = [k for k in params if type(params[k]) in [list, set]]
+        if not list_keys:
+            return [params]
+
+        key = max(list_keys, key=lambda k: len(params[k]))
+        values = sorted({str(v) for v in params[key]})
+        # Length of the URL without any values for the split parameter
+        base_length = len(ApiResource.__request_url(cls.resource_url(), **{**params, key: []}))
+        chunks = ApiResource.__split_values(values, base_length, cls.max_url_length)
+        if len(chunks) == 1:
+            return [params]
+        return [{**params, key: chunk} for chunk in chunks]
+
+    def __split_values(values, base_length, max_length, depth=0):
+        # Values are separated by commas
+        length = base_length + sum(len(v) for v in values) + len(values) - 1
+        if length <= max_length or len(values) < 2 or depth >= 160:
+            return [values]
+
+        # Split the values in two by the next bit of their hashes, and split each half further if needed
+        halves = ([], [])
+        for value in values:
+            digest = hashlib.sha1(value.encode()).digest()
+            halves[(digest[depth // 8] >> (depth % 8)) & 1].append(value)
+        chunks = []
+        for half in halves:
+            if half:
+                chunks.extend(ApiResource.__split_values(half, base_length, max_length, depth + 1))
+        return chunks
+
     @classmethod
     def get(cls, resource_id, **params):
         if re.match("^https:\\/\\/", str(resource_id)):
@@ -216,20 +371,65 @@ class ApiResource(ApiModel):
 
         if cls.enable_cache:
             # Check if we have a cache hit first
-            data = Cache.get(request_url)
+            data, stale = Cache.get_with_staleness(request_url)
             if data:
+                if stale:
+                    # Serve the stale response now, and refresh it for future requests
+                    cls.__refresh_in_background(request_url, data)
                 return data
 
         if ApiResource.enable_mock:
             # We have not mocked out a request for this resource, raise an error
             raise NotFoundException(f"Mocking is currently enabled, but Robinhood request has not been mocked: {request_url}")
 
+        # Concurrent requests for the same URL share a single call to Robinhood
+        return ApiResource.in_flight_requests.call(request_url, cls.__fetch, request_url)
+
+    @classmethod
+    def __refresh_in_background(cls, request_url, stale_data):
+        with ApiResource.refreshing_urls_lock:
+            if request_url in ApiResource.refreshing_urls:
+                return
+            ApiResource.refreshing_urls.add(request_url)
+
+        def refresh():
+            try:
+                ApiResource.in_flight_requests.call(request_url, cls.__fetch, request_url)
+            except ApiInternalErrorException as e:
+                # Robinhood is having issues; keep serving the stale response until it recovers
+                logger.warning("Could not refresh {}, continuing to serve stale response: {}".format(request_url, e))
+                cls.__cache_stale(request_url, stale_data)
+            except Exception:
+                logger.exception("Could not refresh {}".format(request_url))
+            finally:
+                with ApiResource.refreshing_urls_lock:
+                    ApiResource.refreshing_urls.discard(request_url)
+
+        if not executor.submit_background(refresh):
+            # Executor is saturated; try again on a later request
+            with ApiResource.refreshing_urls_lock:
+                ApiResource.refreshing_urls.discard(request_url)
+
+    @classmethod
+    def __cache(cls, request_url, data):
+        Cache.set(request_url, data, cls.cache_timeout, cls.cache_hard_timeout, cls.cache_policy)
+
+    @classmethod
+    def __cache_stale(cls, request_url, data):
+        # Keep the response for another stale period, marked as already stale
+        stale_period = cls.cache_hard_timeout - cls.cache_timeout
+        Cache.set(request_url, data, 0, stale_period)
+
+    @classmethod
+    def __fetch(cls, request_url):
         headers = {}
         auth_provider = None
 
         if cls.authenticated:
-            if ROBINHOOD_AUTHENTICATOR:
-                auth_provider = ROBINHOOD_AUTHENTICATOR.auth_provider()
+            # The authenticator is loaded in the background at startup, wait for it if needed
+            authenticator = wait_for_authenticator(ApiResource.authenticator_timeout)
+            if authenticator:
+                auth_provider = authenticator.auth_provider()
             else:
                 print("Warning: authenticator is not loaded; authentication may have failed due to missing or invalid credentials. Cannot authenticate request; request will likely fail.")
 
@@ -238,8 +438,8 @@ class ApiResource(ApiModel):
         while True:
             attempts -= 1
             try:
-                response = requests.get(request_url, headers=headers, auth=auth_provider)
-            except requests.exceptions.ConnectionError:
+                response = transport.get(request_url, headers=headers, auth=auth_provider)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
                 # Happens occasionally, retry
                 if attempts > 0:
                     logger.warn("Warning: Connection error, retrying")
@@ -254,7 +454,7 @@ class ApiResource(ApiModel):
                 data = response.json()
                 if cls.enable_cache:
                     # Cache response. Only successful calls are cached.
-                    Cache.set(request_url, data, cls.cache_timeout)
+                    cls.__cache(request_url, data)
                 return data
             elif response.status_code == 400:
                 message = "{} (request URL: {})".format(response.text, request_url)
@@ -268,7 +468,7 @@ class ApiResource(ApiModel):
                 raise ApiForbiddenException("Not authorized to access this resource: {}".format(request_url))
             elif response.status_code == 404:
                 return None
-            elif response.status_code > 500:
+            elif response.status_code >= 500:
                 # Internal server error, retry if possible
                 if attempts <= 0:
                     raise ApiInternalErrorException(response.status_code, response.text)
@@ -1,7 +1,8 @@
 import requests
 from datetime import datetime
-from threading import Lock
+from threading import Event, Lock, Thread
 from pathlib import Path
+import os
 
 from credentials import robinhood_credentials
 
@@ -206,21 +207,57 @@ class TokenAuthenticator(Authenticator):
         return msg
     
 AUTHENTICATOR = None
+AUTHENTICATOR_LOCK = Lock()
+AUTHENTICATOR_LOADING = False
+# Set once an attempt to load the authenticator has finished, whether or not it succeeded
+AUTHENTICATOR_ATTEMPTED = Event()
     
 def load_authenticator_instance() -> TokenAuthenticator:
     """
     Loads a Robinhood TokenAuthenticator instance.
-    Should be invoked once at startup time.
+    Should be invoked once at startup time, and again periodically if it could not be loaded.
     Will return None if the Authenticator could not be loaded for whatever reason.
     """
-    global AUTHENTICATOR
+    global AUTHENTICATOR, AUTHENTICATOR_LOADING
     if AUTHENTICATOR:
         return AUTHENTICATOR
-    
-    print("Initializing Authenticator...")
-    AUTHENTICATOR = _load_authenticator()
+
+    with AUTHENTICATOR_LOCK:
+        # Loaded by another thread while waiting for the lock
+        if AUTHENTICATOR:
+            return AUTHENTICATOR
+
+        print("Initializing Authenticator...")
+        AUTHENTICATOR_LOADING = True
+        try:
+            AUTHENTICATOR = _load_authenticator()
+        finally:
+            AUTHENTICATOR_LOADING = False
+            AUTHENTICATOR_ATTEMPTED.set()
+        return AUTHENTICATOR
+
+def wait_for_authenticator(timeout: float) -> TokenAuthenticator:
+    """
+    Returns the Robinhood TokenAuthenticator instance, waiting up to the given number of seconds
+    for the first attempt to load it to finish. Does not load it itself.
+    Will return None if the Authenticator has not been loaded.
+    """
+    AUTHENTICATOR_ATTEMPTED.wait(timeout)
     return AUTHENTICATOR
 
+def _after_fork_in_child():
+    # A worker process forked while the authenticator was loading would otherwise inherit
+    # a held lock and an unset event, with no thread left to release or set them
+    global AUTHENTICATOR_LOCK, AUTHENTICATOR_LOADING, AUTHENTICATOR_ATTEMPTED
+    AUTHENTICATOR_LOCK = Lock()
+    if AUTHENTICATOR_LOADING:
+        AUTHENTICATOR_LOADING = False
+        AUTHENTICATOR_ATTEMPTED = Event()
+        Thread(target=load_authenticator_instance, name='authenticator', daemon=True).start()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+
 
 def _load_authenticator() -> Authenticator:
     device_id = robinhood_credentials.device_id
@@ -1,9 +1,12 @@
 from pathlib import Path
 from django.test import TestCase
-from .authenticator import TokenAuthenticator, load_authenticator_instance, _load_authenticator
+from .authenticator import TokenAuthenticator, load_authenticator_instance, wait_for_authenticator, _load_authenticator
 from credentials import robinhood_credentials
 from .oauth_token import OAuthToken
 from unittest import SkipTest
+from unittest.mock import patch
+from threading import Event
+from . import authenticator as authenticator_module
 import tempfile
 import requests
 
@@ -90,4 +93,44 @@ class AuthTestCase(TestCase):
         response = requests.get(test_url, auth=authenticator.auth_provider())
         self.assertEqual(200, response.status_code, f"Initial auth failed\n{TokenAuthenticator.response_details(response)}")
 
-        return authenticator.oauth_token
\ No newline at end of file
+        return authenticator.oauth_token
+
+class LoadAuthenticatorInstanceTestCase(TestCase):
+
+    def setUp(self):
+        authenticator_module.AUTHENTICATOR = None
+
+    def tearDown(self):
+        authenticator_module.AUTHENTICATOR = None
+
+    def test_failed_load_is_retried(self):
+        loaded = object()
+        with patch.object(authenticator_module, '_load_authenticator', side_effect=[None, loaded]) as load:
+            self.assertIsNone(load_authenticator_instance())
+            self.assertIs(loaded, load_authenticator_instance())
+            self.assertIs(loaded, load_authenticator_instance())
+        self.assertEqual(2, load.call_count)
+
+    def test_requests_do_not_load_authenticator(self):
+        attempted = authenticator_module.AUTHENTICATOR_ATTEMPTED
+        authenticator_module.AUTHENTICATOR_ATTEMPTED = Event()
+        try:
+            with patch.object(authenticator_module, '_load_authenticator') as load:
+                self.assertIsNone(wait_for_authenticator(0))
+            load.assert_not_called()
+        finally:
+            authenticator_module.AUTHENTICATOR_ATTEMPTED = attempted
+
+    def test_loading_resumes_after_fork(self):
+        lock = authenticator_module.AUTHENTICATOR_LOCK
+        attempted = authenticator_module.AUTHENTICATOR_ATTEMPTED
+        loaded = object()
+        try:
+            with lock, patch.object(authenticator_module, '_load_authenticator', return_value=loaded):
+                # As in a child process forked while the authenticator was loading
+                authenticator_module.AUTHENTICATOR_LOADING = True
+                authenticator_module._after_fork_in_child()
+                self.assertIs(loaded, wait_for_authenticator(5))
+        finally:
+            authenticator_module.AUTHENTICATOR_LOCK = lock
+            authenticator_module.AUTHENTICATOR_ATTEMPTED = attempted
@@ -0,0 +1,79 @@
+from datetime import datetime, timedelta, timezone
+from helpers.cache import TimeoutPolicy
+from threading import Lock
+import pytz
+import logging
+
+logger = logging.getLogger('stockbot')
+
+class MarketHoursCachePolicy(TimeoutPolicy):
+    """Cache timeout policy for market data, such as quotes and historicals.
+
+    Market data does not change while the market is closed, so while it is closed,
+    responses are cached until the market's next session opens (including extended hours).
+    While the market is open, each resource's own timeout is used.
+    If the market's hours cannot be determined, each resource's own timeout is used as well.
+    """
+    # Robinhood may take a few minutes to publish the final data points of a session
+    # after the market closes, so keep using the short timeouts until then.
+    SETTLE_TIME = timedelta(minutes=15)
+
+    # Maximum number of days ahead to look for the next open session
+    MAX_DAYS_CLOSED = 10
+
+    def __init__(self, market_mic='XNYS'):
+        self.market_mic = market_mic
+        self.hours_by_date = {}
+        self.hours_lock = Lock()
+
+    def timeout(self, timeout):
+        if timeout is None:
+            # Already cached indefinitely
+            return timeout
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        try:
+            next_open = self.next_open(now)
+        except Exception as e:
+            logger.warning("Could not determine market hours for cache timeout: {}".format(e))
+            return timeout
+        if not next_open:
+            return timeout
+        return max(timeout, int((next_open - now).total_seconds()))
+
+    def is_open(self, now: datetime = None) -> bool:
+        """bool: Whether the market's data may currently be changing."""
+        return self.next_open(now) is None
+
+    def next_open(self, now: datetime = None) -> datetime:
+        """datetime: The time (in naive UTC) at which the market next opens for extended hours trading,
+        or None if the market is currently open."""
+        if not now:
+            now = datetime.now(timezone.utc).replace(tzinfo=None)
+        market_date = pytz.utc.localize(now).astimezone(pytz.timezone('US/Eastern')).date()
+
+        hours = self.hours(market_date)
+        if hours.is_open:
+            if now < hours.extended_opens_at:
+                return hours.extended_opens_at
+            if now < hours.extended_closes_at + self.SETTLE_TIME:
+                return None
+
+        for days_ahead in range(1, self.MAX_DAYS_CLOSED + 1):
+            hours = self.hours(market_date + timedelta(days=days_ahead))
+            if hours.is_open:
+                return hours.extended_opens_at
+        raise Exception("Market {} has no open sessions in the next {} days".format(self.market_mic, self.MAX_DAYS_CLOSED))
+
+    def hours(self, market_date):
+        # Hours for a given date do not change, so they only need to be looked up once
+        hours = self.hours_by_date.get(market_date)
+        if hours is None:
+            from robinhood.models import Market
+            hours = Market(mic=self.market_mic).hours(market_date)
+            with self.hours_lock:
+                if len(self.hours_by_date) > self.MAX_DAYS_CLOSED * 2:
+                    self.hours_by_date.clear()
+                self.hours_by_date[market_date] = hours
+        return hours
+
+market_hours_cache_policy = MarketHoursCachePolicy()
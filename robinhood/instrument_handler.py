@@ -50,6 +50,21 @@ class InstrumentHandler():
         for a stock universally."""
         raise BadRequestException("Not implemented")
 
+    def batch_search(self, search_params):
+        """dict: Optionally finds instruments for many identifiers with fewer requests than
+        one search per identifier. Given the search parameters of each identifier, returns
+        the instruments found by identifier. Identifiers left out are searched for separately.
+        Defaults to finding none."""
+        return {}
+
+    instrument_catalog = None
+    """module: An optional local catalog of instruments, consulted before Robinhood
+    and filled with the instruments retrieved from it. Instruments are found in the catalog
+    by ID, or by their standard identifier. Set by the app storing the catalog, defaults to None."""
+
+    def catalog(self):
+        return self.instrument_catalog
+
     ### End of methods/fields to implement
 
     UUID_PATTERN = re.compile('.*\/?([0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12})\/?$')
@@ -86,9 +101,12 @@ class InstrumentHandler():
     def get_instruments(self, instrument_map, get_params):
         ids_to_retrieve = set()
 
+        catalog = self.catalog()
+        catalogued = catalog.find_by_ids(id.lower() for id in get_params.values()) if catalog and get_params else {}
+
         for url in get_params:
-            # Check if instrument is in the cache before querying Robinhood
-            data = Cache.get(url)
+            # Check if instrument is in the catalog or the cache before querying Robinhood
+            data = catalogued.get(get_params[url].lower()) or Cache.get(url)
             if data:
                 instrument = self.instrument_class()(**data)
                 self.set_instrument(instrument_map, instrument)
@@ -99,6 +117,8 @@ class InstrumentHandler():
         # Perform a batch query for the rest of the ids
         if ids_to_retrieve:
             retrieved_instruments = self.instrument_class().search(ids=ids_to_retrieve)
+            if catalog:
+                catalog.save(retrieved_instruments)
             for instrument in retrieved_instruments:
                 self.set_instrument(instrument_map, instrument)
 
@@ -108,17 +128,24 @@ class InstrumentHandler():
                 Cache.set(search_url, {'results': [instrument.data]})
 
     def search_instruments(self, instrument_map, search_params):
+        unresolved_params = {}
         search_jobs = {}
 
-        # Initiate a thread pool for these requests.
-        # Using a shared thread pool can cause hanging
-        # when using a multi-process runner such as uwsgi.
-        with thread_pool(10) as pool:
-            for identifier in search_params:
-                instrument = None
-                params = search_params[identifier]
-                search_url = self.build_search_url(params)
+        catalog = self.catalog()
+        catalogued = {}
+        if catalog and search_params:
+            catalogued = catalog.find_by_symbols(self.standard_identifier(i) for i in search_params)
+
+        for identifier in search_params:
+            instrument = None
+            params = search_params[identifier]
+            search_url = self.build_search_url(params)
 
+            # Check if instrument is in the catalog or the cache before querying Robinhood
+            data = catalogued.get(self.standard_identifier(identifier))
+            if data:
+                instrument = self.instrument_class()(**data)
+            else:
                 data = Cache.get(search_url)
                 if data:
                     if 'results' in data:
@@ -130,15 +157,40 @@ class InstrumentHandler():
                     else:
                         instrument = self.instrument_class()(**data)
 
-                if instrument:
-                    self.set_instrument(instrument_map, instrument, identifier)
-                else:
-                    search_jobs[identifier] = pool.call(self.instrument_class().search, **params)
+            if instrument:
+                self.set_instrument(instrument_map, instrument, identifier)
+            else:
+                unresolved_params[identifier] = params
+
+        retrieved = []
+        try:
+            batched = self.batch_search(unresolved_params) if unresolved_params else {}
+            for identifier, instrument in batched.items():
+                retrieved.append(instrument)
+                self.set_instrument(instrument_map, instrument, identifier)
+                # Cache results as if they had been searched for separately
+                Cache.set(self.build_search_url(unresolved_params[identifier]), {'results': [instrument.data]})
+                Cache.set(instrument.url, instrument.data)
+
+            # Search for the remaining instruments concurrently using the shared executor.
+            # The executor restarts its threads in each forked worker process,
+            # so it is safe to use with a multi-process runner such as uwsgi.
+            with thread_pool() as pool:
+                for identifier, params in unresolved_params.items():
+                    if identifier not in batched:
+                        search_jobs[identifier] = pool.call(self.instrument_class().search, **params)
+
+            self.__search_results(instrument_map, search_params, search_jobs, retrieved)
+        finally:
+            if catalog:
+                catalog.save(retrieved)
 
+    def __search_results(self, instrument_map, search_params, search_jobs, retrieved):
         for identifier in search_jobs:
             params = search_params[identifier]
             search_job = search_jobs[identifier]
             retrieved_instruments = search_job.get()
+            retrieved.extend(retrieved_instruments)
             search_url = self.build_search_url(params)
 
             # Cache results for the search query
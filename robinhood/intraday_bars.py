@@ -0,0 +1,62 @@
+"""Incremental decoding of intraday historicals.
+
+Robinhood's historicals endpoints cannot be asked for only the data points after a given time,
+so the historicals of a day chart are downloaded in full whenever they are refreshed. Between
+refreshes, though, only the end of the day changes: new data points are added, and the last one
+keeps changing until its interval has passed. The decoded data points of each instrument are therefore
+kept, and when its historicals are refreshed, only the data points from the last kept one onward are
+decoded, merged by begins_at and appended, replacing the still-forming last data point.
+"""
+from collections import OrderedDict
+from threading import Lock
+import numpy as np
+
+class IntradayBarStore():
+    # Maximum number of instruments whose data points are kept in memory
+    MAX_INSTRUMENTS = 1024
+
+    def __init__(self):
+        self.lock = Lock()
+        # (begins_at strings, decoded columns) by (resource, instrument, interval, bounds)
+        self.entries = OrderedDict()
+
+    def columns(self, key, data_points: list[dict], decode):
+        """HistoricalColumns: The data points decoded with the given function,
+        reusing the data points decoded for the same key beforehand."""
+        with self.lock:
+            entry = self.entries.get(key)
+
+        begins_at = [p.get('begins_at') for p in data_points]
+        columns = IntradayBarStore.__merge(entry, begins_at, data_points, decode) if entry else None
+        if columns is None:
+            columns = decode(data_points)
+            for field in columns.__slots__:
+                getattr(columns, field).flags.writeable = False
+
+        with self.lock:
+            self.entries[key] = (begins_at, columns)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.MAX_INSTRUMENTS:
+                self.entries.popitem(last=False)
+        return columns
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    @staticmethod
+    def __merge(entry, begins_at, data_points, decode):
+        kept_begins_at, kept = entry
+        # The last kept data point may have changed since, and is always decoded again
+        kept_count = len(kept_begins_at) - 1
+        if kept_count < 1 or len(begins_at) < kept_count or begins_at[:kept_count] != kept_begins_at[:kept_count]:
+            # e.g. a new trading day
+            return None
+
+        tail = decode(data_points[kept_count:])
+        fields = [np.concatenate((getattr(kept, f)[:kept_count], getattr(tail, f))) for f in kept.__slots__]
+        for field in fields:
+            field.flags.writeable = False
+        return type(kept)(*fields)
+
+intraday_bars = IntradayBarStore()
@@ -1,7 +1,10 @@
-from robinhood.api import ApiModel, ApiResource
+from robinhood.api import ApiModel, ApiResource, decode_bool, decode_datetime
+from robinhood.cache_policy import market_hours_cache_policy
+from robinhood.intraday_bars import intraday_bars
 from datetime import datetime, date, timedelta
 from pytz import timezone
 from dateutil import parser as dateparser
+import numpy as np
 
 class Authentication(ApiResource):
     endpoint_path = "/api-token-auth"
@@ -18,6 +21,71 @@ class HistoricalItem(ApiModel):
         'interpolated': bool
     }
 
+class HistoricalColumns():
+    """Historical data points decoded into one NumPy array per field, rather than one object per data point.
+    `begins_at` is a datetime64 array of UTC times, prices are float64 arrays (NaN when missing),
+    and `interpolated` is a bool array."""
+    __slots__ = ('begins_at', 'open_price', 'close_price', 'interpolated')
+
+    def __init__(self, begins_at, open_price, close_price, interpolated):
+        self.begins_at = begins_at
+        self.open_price = open_price
+        self.close_price = close_price
+        self.interpolated = interpolated
+
+    def __len__(self):
+        return len(self.begins_at)
+
+    @classmethod
+    def from_data_points(cls, data_points: list[dict]):
+        fields = [(p.get('begins_at'), p.get('open_price'), p.get('close_price'), p.get('interpolated')) for p in data_points]
+        begins_at, open_price, close_price, interpolated = zip(*fields) if fields else ([], [], [], [])
+        return cls(
+            HistoricalColumns.__datetimes(begins_at),
+            np.array(open_price, dtype=np.float64),
+            np.array(close_price, dtype=np.float64),
+            np.fromiter((decode_bool(i) for i in interpolated), dtype=bool, count=len(interpolated))
+        )
+
+    @classmethod
+    def from_items(cls, items: list[HistoricalItem]):
+        return cls(
+            np.array([i.begins_at for i in items], dtype='datetime64[us]'),
+            np.array([i.open_price for i in items], dtype=np.float64),
+            np.array([i.close_price for i in items], dtype=np.float64),
+            np.array([bool(i.interpolated) for i in items], dtype=bool)
+        )
+
+    @staticmethod
+    def __datetimes(values):
+        try:
+            # NumPy parses timezone-naive ISO-8601 strings natively; Robinhood's timestamps are all in UTC
+            return np.array([v[:-1] if v.endswith('Z') else v for v in values], dtype='datetime64[us]')
+        except (ValueError, TypeError, AttributeError):
+            return np.array([decode_datetime(v) for v in values], dtype='datetime64[us]')
+
+class HistoricalsResource(ApiResource):
+    """Base class for historical data resources, whose list items are HistoricalItems."""
+    __slots__ = ('_columns',)
+
+    def __init__(self, **data):
+        self._columns = None
+        super().__init__(**data)
+
+    def columns(self) -> HistoricalColumns:
+        """HistoricalColumns: The data points of this resource as NumPy arrays, decoded on first access."""
+        if self._columns is None:
+            list_key = self.__class__.Item.list_key
+            if self._items is None and self.data.get('span') == 'day' and self.data.get('instrument'):
+                # Intraday data points are refreshed often, and only change at the end
+                key = (self.__class__.__qualname__, self.data['instrument'], self.data.get('interval'), self.data.get('bounds'))
+                self._columns = intraday_bars.columns(key, self.data.get(list_key, []), HistoricalColumns.from_data_points)
+            elif self._items is None:
+                self._columns = HistoricalColumns.from_data_points(self.data.get(list_key, []))
+            else:
+                self._columns = HistoricalColumns.from_items(self._items)
+        return self._columns
+
 class NotImplementedException(Exception):
     def __init__(self, calling_class, method_name):
         message = "{} method is not implemented for {}".format(method_name, calling_class)
@@ -121,11 +189,15 @@ class Instrument(ApiResource):
 class Stock(Instrument):
     endpoint_path = "/instruments"
     cache_timeout = 600
+    cache_hard_timeout = 86400
+    cache_policy = market_hours_cache_policy
 
     class Quote(ApiResource):
         endpoint_path = "/quotes"
         authenticated = True
-        enable_cache = False
+        # Quotes are only cached while the market is closed
+        cache_timeout = 0
+        cache_policy = market_hours_cache_policy
 
         attributes = {
             'symbol': str,
@@ -147,10 +219,12 @@ class Stock(Instrument):
             'description': str
         }
 
-    class Historicals(ApiResource):
+    class Historicals(HistoricalsResource):
         endpoint_path = "/quotes/historicals"
         authenticated = True
         cache_timeout = 300
+        cache_hard_timeout = 900
+        cache_policy = market_hours_cache_policy
 
         attributes = {
             'previous_close_price': float,
@@ -213,7 +287,9 @@ class Option(Instrument):
     class Quote(ApiResource):
         endpoint_path = "/marketdata/options"
         authenticated = True
-        enable_cache = False
+        # Quotes are only cached while the market is closed
+        cache_timeout = 0
+        cache_policy = market_hours_cache_policy
 
         attributes = {
             'adjusted_mark_price': float,
@@ -224,10 +300,12 @@ class Option(Instrument):
         def price(self):
             return self.adjusted_mark_price
 
-    class Historicals(ApiResource):
+    class Historicals(HistoricalsResource):
         endpoint_path = "/marketdata/options/historicals"
         authenticated = True
         cache_timeout = 300
+        cache_hard_timeout = 900
+        cache_policy = market_hours_cache_policy
 
         attributes = {
             'instrument': str,
@@ -277,6 +355,25 @@ class Option(Instrument):
         symbol = self.chain_symbol
         return "{}{}{}@{}".format(symbol, price, type, expiration)
 
+class OptionChain(ApiResource):
+    """All options of an underlying stock, referenced by the stock's `tradable_chain_id`."""
+    endpoint_path = "/options/chains"
+    authenticated = True
+    cache_timeout = 3600
+    cache_hard_timeout = 86400
+
+    attributes = {
+        'id': str,
+        'symbol': str,
+        'can_open_position': bool,
+        # Upcoming expiration dates of the chain's options, as ISO dates
+        'expiration_dates': list
+    }
+
+    def expirations(self):
+        """list: Upcoming expiration dates of the chain's options, earliest first."""
+        return sorted(date.fromisoformat(d) for d in self.expiration_dates or [])
+
 class NewsItem(ApiModel):
     attributes = {
         'url': str,
@@ -0,0 +1,96 @@
+"""Resolution of option identifiers from whole option chains.
+
+Searching Robinhood for each option separately costs one paginated search per option, and without
+an expiration date, a search through every active expiration of the option just to find the earliest.
+Instead, the options of a chain are retrieved once per expiration date, and indexed by strike price
+and type in memory. All options on the same underlying stock are then resolved with lookups,
+and the earliest expiration with a given option is found by checking each expiration in order.
+"""
+from collections import OrderedDict
+from datetime import date
+from threading import Lock
+from time import monotonic
+
+from exceptions import NotFoundException
+from robinhood.models import Option, OptionChain
+from robinhood.stock_handler import StockHandler
+
+class OptionChainIndex():
+    # Number of expirations of a chain to check for an option without an expiration date,
+    # before falling back to searching Robinhood for it
+    MAX_EXPIRATIONS_CHECKED = 4
+    # Number of seconds the options of an expiration are kept in memory for
+    EXPIRATION_TTL = 600
+    # Maximum number of expirations kept in memory
+    MAX_EXPIRATIONS = 256
+
+    def __init__(self):
+        self.lock = Lock()
+        # Options by (strike price, type), by (chain ID, expiration date)
+        self.expirations = OrderedDict()
+
+    def find(self, chain_symbol: str, strike_price: float, type: str, expiration_date: date = None) -> Option:
+        """Option: The option matching the parameters, or the earliest expiring active one if no
+        expiration date is given. Returns None if it cannot be found from its chain."""
+        chain = self.chain(chain_symbol)
+        if not chain:
+            return None
+
+        key = OptionChainIndex.__option_key(strike_price, type)
+        if expiration_date:
+            option = self.options(chain, expiration_date).get(key)
+            if option and option.state != 'inactive': # Removed or deactivated, not expired
+                return option
+            return None
+
+        today = date.today()
+        upcoming = [e for e in chain.expirations() if e >= today]
+        for expiration in upcoming[:self.MAX_EXPIRATIONS_CHECKED]:
+            option = self.options(chain, expiration).get(key)
+            if option and option.state == 'active':
+                return option
+        return None
+
+    def chain(self, chain_symbol: str) -> OptionChain:
+        """OptionChain: The chain of the stock with the given symbol, if there is one."""
+        try:
+            stock = StockHandler().find_instruments(chain_symbol).get(chain_symbol)
+            if not stock or not stock.tradable_chain_id:
+                return None
+            chain = OptionChain.get(stock.tradable_chain_id)
+        except NotFoundException:
+            # Not a stock symbol, e.g. the symbol of a chain adjusted after a split
+            return None
+        if not chain or chain.symbol != chain_symbol:
+            return None
+        return chain
+
+    def options(self, chain: OptionChain, expiration_date: date) -> dict:
+        """dict: Options of the chain expiring on the given date, by (strike price, type)."""
+        expiration_key = (chain.id, expiration_date)
+        with self.lock:
+            entry = self.expirations.get(expiration_key)
+            if entry and monotonic() - entry[0] < self.EXPIRATION_TTL:
+                self.expirations.move_to_end(expiration_key)
+                return entry[1]
+
+        options = {}
+        for option in Option.search(chain_id=chain.id, expiration_dates=expiration_date):
+            options[OptionChainIndex.__option_key(option.strike_price, option.type)] = option
+
+        with self.lock:
+            self.expirations[expiration_key] = (monotonic(), options)
+            self.expirations.move_to_end(expiration_key)
+            while len(self.expirations) > self.MAX_EXPIRATIONS:
+                self.expirations.popitem(last=False)
+        return options
+
+    def clear(self):
+        with self.lock:
+            self.expirations.clear()
+
+    def __option_key(strike_price, type):
+        # Strike prices are in cents at most
+        return (round(strike_price, 2), type)
+
+option_chain_index = OptionChainIndex()
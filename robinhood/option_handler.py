@@ -1,9 +1,15 @@
 from .instrument_handler import InstrumentHandler
 from robinhood.models import Option
+from robinhood.option_chains import option_chain_index
+from helpers.pool import thread_pool
 from dateutil import parser as dateparser
+from robinhood.api import ApiCallException
 from exceptions import BadRequestException
+import logging
 import re
 
+logger = logging.getLogger('stockbot')
+
 class OptionHandler(InstrumentHandler):
 
     TYPE = 'option'
@@ -33,6 +39,39 @@ class OptionHandler(InstrumentHandler):
     def authenticated(self):
         return True
 
+    def search_instruments(self, instrument_map, search_params):
+        # Resolve options from their chains, concurrently for each underlying stock
+        params_by_symbol = {}
+        for identifier, params in search_params.items():
+            params_by_symbol.setdefault(params['chain_symbol'], {})[identifier] = params
+
+        with thread_pool() as pool:
+            jobs = [pool.call(self.__find_in_chain, identifiers_params) for identifiers_params in params_by_symbol.values()]
+        found = {}
+        for job in jobs:
+            found.update(job.get())
+
+        for identifier, option in found.items():
+            self.set_instrument(instrument_map, option, identifier)
+
+        # Search Robinhood for any options which could not be found from their chain
+        unresolved_params = {i: params for i, params in search_params.items() if i not in found}
+        if unresolved_params:
+            super().search_instruments(instrument_map, unresolved_params)
+
+    def __find_in_chain(self, identifiers_params):
+        found = {}
+        try:
+            for identifier, params in identifiers_params.items():
+                option = option_chain_index.find(params['chain_symbol'], params['strike_price'], params['type'],
+                    params.get('expiration_date'))
+                if option:
+                    found[identifier] = option
+        except ApiCallException as e:
+            # The remaining options are searched for separately instead
+            logger.warning("Could not find options from their chain: {}".format(e))
+        return found
+
     def filter_results(self, instruments, params):
         # Sort options in order of expiration date
         instruments.sort(key=lambda o: o.expiration_date)
@@ -1,11 +1,19 @@
 from .instrument_handler import InstrumentHandler
 from robinhood.models import Stock
+from robinhood.api import ApiCallException
+from helpers.pool import thread_pool
+import logging
+
+logger = logging.getLogger('stockbot')
 
 class StockHandler(InstrumentHandler):
     TYPE = 'stock'
     FORMAT = '^[A-Z.]{1,14}$'
     EXAMPLE = 'AMZN'
 
+    # Maximum number of symbols resolved by a single batch of requests
+    BATCH_SIZE = 25
+
     def instrument_class(self):
         return Stock
 
@@ -16,3 +24,33 @@ class StockHandler(InstrumentHandler):
 
     def standard_identifier(self, identifier):
         return identifier.upper()
+
+    def batch_search(self, search_params):
+        # Stocks cannot be searched for by several symbols at once, but their quotes can,
+        # and each quote references its stock, which can then be retrieved by ID in one request
+        if len(search_params) < 2:
+            return {}
+        identifiers_by_symbol = {params['symbol']: identifier for identifier, params in search_params.items()}
+        symbols = list(identifiers_by_symbol)
+
+        with thread_pool() as pool:
+            jobs = [pool.call(self.__search_batch, symbols[i:i + self.BATCH_SIZE])
+                for i in range(0, len(symbols), self.BATCH_SIZE)]
+        stocks = {}
+        for job in jobs:
+            stocks.update(job.get())
+        return {identifiers_by_symbol[symbol]: stock for symbol, stock in stocks.items()}
+
+    def __search_batch(self, symbols):
+        try:
+            quotes = Stock.Quote.search(symbols=symbols)
+            # Unknown symbols have no quote
+            instrument_urls = {quote.symbol: quote.instrument for quote in quotes if quote.symbol in symbols}
+            ids = [InstrumentHandler.UUID_PATTERN.match(url)[1] for url in instrument_urls.values()]
+            stocks_by_url = {stock.url: stock for stock in Stock.search(ids=ids)} if ids else {}
+        except ApiCallException as e:
+            # The symbols are searched for separately instead
+            logger.warning("Could not search for a batch of stocks: {}".format(e))
+            return {}
+        return {symbol: stocks_by_url[url] for symbol, url in instrument_urls.items()
+            if url in stocks_by_url and stocks_by_url[url].symbol == symbol}
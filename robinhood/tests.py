@@ -0,0 +1,410 @@
+from django.test import TestCase, override_settings
+from robinhood.transport import Transport
+from helpers.single_flight import SingleFlight
+from helpers.pool import Executor
+from threading import Event, Thread
+from time import sleep
+from unittest.mock import patch
+from robinhood.api import ApiResource, ApiInternalErrorException, ApiUnauthorizedException
+from exceptions import NotFoundException
+from helpers.cache import Cache
+from helpers.cache_backends import SQLiteCache
+from django.core.cache import caches
+import tempfile
+import os
+from robinhood.models import HistoricalColumns, HistoricalItem, Stock, Option, Market
+from robinhood.intraday_bars import intraday_bars
+from robinhood.cache_policy import MarketHoursCachePolicy
+from robinhood.option_chains import option_chain_index
+from robinhood.option_handler import OptionHandler
+from robinhood.stock_handler import StockHandler
+from helpers.test_helpers import mock_option_workflow, mock_stock, mock_stock_quote
+from math import isnan
+from datetime import date, datetime, timedelta, timezone
+
+class TransportTestCase(TestCase):
+
+    def test_session_is_reused(self):
+        transport = Transport()
+        session = transport.current_session()
+        self.assertIs(session, transport.current_session())
+        transport.close()
+
+    def test_session_is_rebuilt_after_fork(self):
+        transport = Transport()
+        session = transport.current_session()
+        # Simulate running in a forked child process
+        transport.pid = -1
+        self.assertIsNot(session, transport.current_session())
+        transport.close()
+
+class SingleFlightTestCase(TestCase):
+
+    def test_concurrent_calls_are_shared(self):
+        single_flight = SingleFlight()
+        release = Event()
+        calls = []
+
+        def slow_call():
+            calls.append(1)
+            release.wait(5)
+            return {'results': []}
+
+        threads = [Thread(target=single_flight.call, args=('key', slow_call)) for _ in range(5)]
+        for t in threads:
+            t.start()
+        # Wait until every follower is waiting on the first call
+        while single_flight.stats()['shared'] < 4:
+            sleep(0.01)
+        release.set()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(1, len(calls))
+        self.assertEqual({'calls': 1, 'shared': 4, 'in_flight': 0}, single_flight.stats())
+
+    def test_exceptions_are_raised(self):
+        single_flight = SingleFlight()
+
+        def failing_call():
+            raise ValueError("failed")
+
+        self.assertRaises(ValueError, single_flight.call, 'key', failing_call)
+        self.assertEqual(0, single_flight.stats()['in_flight'])
+
+class StaleWhileRevalidateTestCase(TestCase):
+
+    class StaleResource(ApiResource):
+        endpoint_path = '/stale'
+        cache_timeout = 60
+        cache_hard_timeout = 600
+
+    def setUp(self):
+        self.url = self.StaleResource.resource_url()
+        # Cache a response which is already past its soft timeout
+        Cache.set(self.url, {'value': 'stale'}, 0, 600)
+
+    def tearDown(self):
+        Cache.delete(self.url)
+
+    def test_stale_response_is_refreshed(self):
+        with patch.object(self.StaleResource, '_ApiResource__fetch', classmethod(self.fresh_fetch)):
+            self.assertEqual({'value': 'stale'}, self.StaleResource.request(self.url))
+            self.wait_for_refresh()
+        self.assertEqual(({'value': 'fresh'}, False), Cache.get_with_staleness(self.url))
+
+    def test_stale_response_is_kept_on_errors(self):
+        with patch.object(self.StaleResource, '_ApiResource__fetch', classmethod(self.failing_fetch)):
+            self.assertEqual({'value': 'stale'}, self.StaleResource.request(self.url))
+            self.wait_for_refresh()
+        self.assertEqual(({'value': 'stale'}, True), Cache.get_with_staleness(self.url))
+
+    def fresh_fetch(self, cls, request_url):
+        data = {'value': 'fresh'}
+        Cache.set(request_url, data, cls.cache_timeout, cls.cache_hard_timeout)
+        return data
+
+    def failing_fetch(self, cls, request_url):
+        raise ApiInternalErrorException(503, "Service Unavailable")
+
+    def wait_for_refresh(self):
+        while ApiResource.refreshing_urls:
+            sleep(0.01)
+
+class ApiModelTestCase(TestCase):
+
+    def test_decode_attributes(self):
+        item = HistoricalItem(begins_at='2024-01-02T09:30:00-05:00', open_price='1.5', interpolated='true')
+        self.assertEqual(datetime(2024, 1, 2, 14, 30), item.begins_at)
+        self.assertEqual(1.5, item.open_price)
+        self.assertIsNone(item.close_price)
+        self.assertTrue(item.interpolated)
+
+    def test_decode_nonstandard_timestamps(self):
+        item = HistoricalItem(begins_at='Jan 2 2024 14:30:00 UTC')
+        self.assertEqual(datetime(2024, 1, 2, 14, 30), item.begins_at)
+
+    def test_models_use_slots(self):
+        stock = Stock(id='1', symbol='FAKE', list_date='2020-01-02')
+        self.assertFalse(hasattr(stock, '__dict__'))
+        self.assertEqual(date(2020, 1, 2), stock.list_date)
+
+class HistoricalColumnsTestCase(TestCase):
+
+    def test_columns_match_items(self):
+        historicals = Stock.Historicals(historicals=[
+            {'begins_at': '2024-01-02T14:30:00Z', 'open_price': '1.50', 'close_price': '2.00', 'interpolated': False},
+            {'begins_at': '2024-01-02T14:35:00Z', 'open_price': None, 'close_price': '2.50', 'interpolated': True}
+        ])
+        columns = historicals.columns()
+        items = historicals.items
+        self.assertEqual([i.begins_at for i in items], columns.begins_at.astype(datetime).tolist())
+        self.assertEqual(1.5, columns.open_price[0])
+        self.assertTrue(isnan(columns.open_price[1]))
+        self.assertEqual([i.close_price for i in items], columns.close_price.tolist())
+        self.assertEqual([False, True], columns.interpolated.tolist())
+
+    def test_columns_from_items(self):
+        begins_at = datetime(2024, 1, 2, 14, 30)
+        historicals = Option.Historicals(items=[
+            Option.Historicals.Item(begins_at=begins_at, open_price=1.0, close_price=2.0, interpolated=False)
+        ])
+        columns = historicals.columns()
+        self.assertEqual([begins_at], columns.begins_at.astype(datetime).tolist())
+        self.assertEqual([2.0], columns.close_price.tolist())
+
+class IntradayBarStoreTestCase(TestCase):
+
+    def setUp(self):
+        intraday_bars.clear()
+
+    def test_refreshed_bars_are_merged(self):
+        first = self.historicals(['14:30', '14:35'], [1.0, 2.0]).columns()
+        with patch.object(HistoricalColumns, 'from_data_points', wraps=HistoricalColumns.from_data_points) as decode:
+            # The last bar changed, and a new one was added
+            columns = self.historicals(['14:30', '14:35', '14:40'], [1.0, 2.5, 3.0]).columns()
+        # Only the bars from the still-forming one onward are decoded
+        self.assertEqual(2, len(decode.call_args.args[0]))
+        self.assertEqual([1.0, 2.5, 3.0], columns.close_price.tolist())
+        self.assertEqual(3, len(columns.begins_at))
+        self.assertEqual([1.0, 2.0], first.close_price.tolist())
+
+    def test_new_day_is_decoded_in_full(self):
+        self.historicals(['14:30', '14:35'], [1.0, 2.0]).columns()
+        columns = self.historicals(['14:35', '14:40'], [2.0, 3.0], day='03').columns()
+        self.assertEqual([2.0, 3.0], columns.close_price.tolist())
+
+    def historicals(self, times, prices, day='02'):
+        return Stock.Historicals(instrument='https://api.robinhood.com/instruments/intraday/', span='day',
+            interval='5minute', bounds='trading', historicals=[
+                {'begins_at': '2024-01-{}T{}:00Z'.format(day, t), 'open_price': p, 'close_price': p, 'interpolated': False}
+                for t, p in zip(times, prices)
+            ])
+
+class ExecutorTestCase(TestCase):
+
+    def test_submit(self):
+        executor = Executor()
+        tasks = [executor.submit(pow, i, 2) for i in range(10)]
+        self.assertEqual([i ** 2 for i in range(10)], [t.get() for t in tasks])
+        self.assertEqual(10, executor.stats()['completed'])
+
+    def test_exceptions_are_raised(self):
+        executor = Executor()
+        task = executor.submit(int, 'not a number')
+        self.assertRaises(ValueError, task.get)
+
+    @override_settings(EXECUTOR_MAX_WORKERS=1)
+    def test_nested_tasks_do_not_deadlock(self):
+        executor = Executor()
+
+        def outer():
+            inner_tasks = [executor.submit(pow, i, 2) for i in range(5)]
+            return sum(t.get() for t in inner_tasks)
+
+        self.assertEqual(30, executor.submit(outer).get(timeout=5))
+
+    @override_settings(EXECUTOR_MAX_QUEUE_SIZE=0)
+    def test_full_queue_runs_in_caller(self):
+        executor = Executor()
+        self.assertEqual(4, executor.submit(pow, 2, 2).get())
+        self.assertIsNone(executor.submit_background(pow, 2, 2))
+        self.assertEqual(2, executor.stats()['rejected'])
+
+    def test_restarts_after_fork(self):
+        executor = Executor()
+        executor.submit(pow, 2, 2).get()
+        # Simulate running in a forked child process
+        executor.pid = -1
+        self.assertEqual(9, executor.submit(pow, 3, 2).get())
+        self.assertEqual(1, executor.stats()['submitted'])
+
+class SQLiteCacheTestCase(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache = SQLiteCache(os.path.join(self.directory.name, 'cache.sqlite3'), {'TIMEOUT': 60})
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_set_and_get(self):
+        self.cache.set('key', {'results': [1, 2]})
+        self.assertEqual({'results': [1, 2]}, self.cache.get('key'))
+        self.assertIsNone(self.cache.get('missing'))
+
+    def test_expired_entries(self):
+        self.cache.set('key', 'value', 0)
+        self.assertIsNone(self.cache.get('key'))
+        self.assertTrue(self.cache.add('key', 'new value'))
+        self.assertFalse(self.cache.add('key', 'newer value'))
+        self.assertEqual('new value', self.cache.get('key'))
+
+    def test_delete(self):
+        self.cache.set_many({'a': 1, 'b': 2})
+        self.assertTrue(self.cache.delete('a'))
+        self.assertEqual({'b': 2}, self.cache.get_many(['a', 'b']))
+
+class CacheTiersTestCase(TestCase):
+
+    def test_local_cache_is_filled_from_shared_cache(self):
+        Cache.set('tiered', 'value', 60)
+        caches[Cache.local_cache_name()].clear()
+        stats = Cache.stats()
+
+        self.assertEqual('value', Cache.get('tiered'))
+        self.assertEqual('value', Cache.get('tiered'))
+
+        new_stats = Cache.stats()
+        self.assertEqual(stats['l1']['misses'] + 1, new_stats['l1']['misses'])
+        self.assertEqual(stats['l1']['hits'] + 1, new_stats['l1']['hits'])
+        self.assertEqual(stats['l2']['hits'] + 1, new_stats['l2']['hits'])
+        Cache.delete('tiered')
+
+    def test_staleness_is_stored_with_value(self):
+        Cache.set('staleable', 'value', 0.1, 60)
+        self.assertEqual(('value', False), Cache.get_with_staleness('staleable'))
+        sleep(0.15)
+        # Read from the shared cache, as by another process
+        caches[Cache.local_cache_name()].clear()
+        self.assertEqual(('value', True), Cache.get_with_staleness('staleable'))
+        self.assertEqual('value', Cache.get('staleable'))
+        self.assertEqual('value', Cache.get_shared('staleable'))
+        Cache.delete('staleable')
+        self.assertEqual((None, False), Cache.get_with_staleness('staleable'))
+
+class MarketHoursCachePolicyTestCase(TestCase):
+    # Friday, followed by a weekend
+    FRIDAY = date(2024, 1, 5)
+
+    def setUp(self):
+        self.policy = MarketHoursCachePolicy()
+        self.policy.hours = self.hours
+
+    def hours(self, market_date):
+        if market_date.weekday() >= 5:
+            return Market.Hours(is_open=False)
+        day = datetime(market_date.year, market_date.month, market_date.day, tzinfo=timezone.utc)
+        return Market.Hours(
+            is_open=True,
+            extended_opens_at=(day + timedelta(hours=13)).isoformat(),
+            extended_closes_at=(day + timedelta(hours=25)).isoformat()
+        )
+
+    def test_open_market(self):
+        now = datetime(2024, 1, 5, 18)
+        self.assertTrue(self.policy.is_open(now))
+
+    def test_closed_over_weekend(self):
+        now = datetime(2024, 1, 6, 18)
+        self.assertFalse(self.policy.is_open(now))
+        self.assertEqual(datetime(2024, 1, 8, 13), self.policy.next_open(now))
+
+    def test_closed_before_open(self):
+        now = datetime(2024, 1, 5, 12)
+        self.assertEqual(datetime(2024, 1, 5, 13), self.policy.next_open(now))
+
+    def test_timeout_is_not_reduced(self):
+        with patch.object(self.policy, 'next_open', return_value=None):
+            self.assertEqual(300, self.policy.timeout(300))
+            self.assertEqual(0, self.policy.timeout(0))
+        self.assertIsNone(self.policy.timeout(None))
+
+    def test_timeout_until_next_open(self):
+        next_open = datetime.now(timezone.utc).replace(tzinfo=None) + timedelta(hours=10)
+        with patch.object(self.policy, 'next_open', return_value=next_open):
+            self.assertAlmostEqual(36000, self.policy.timeout(300), delta=5)
+
+    def test_unknown_hours_use_default_timeout(self):
+        with patch.object(self.policy, 'next_open', side_effect=NotFoundException("No hours")):
+            self.assertEqual(300, self.policy.timeout(300))
+
+class OptionChainIndexTestCase(TestCase):
+
+    def setUp(self):
+        ApiResource.enable_mock = True
+        option_chain_index.clear()
+
+    def test_options_resolved_from_chain(self):
+        identifiers = ['FAKE10P12-21', 'FAKE12.5C12-21', 'FAKE10P']
+        mocked = mock_option_workflow(*identifiers)
+        with patch.object(Option, 'search', wraps=Option.search) as search:
+            options = OptionHandler().find_instruments(*identifiers)
+        for identifier, option in zip(identifiers, mocked):
+            self.assertEqual(option.id, options[identifier].id)
+        # One search per expiration of the chain, rather than one per option
+        self.assertEqual(2, search.call_count)
+        for call in search.call_args_list:
+            self.assertEqual(mocked[0].chain_id, call.kwargs['chain_id'])
+
+    def test_unknown_chain_falls_back_to_search(self):
+        option = mock_option_workflow('FAKE10P12-21')
+        with patch.object(option_chain_index, 'chain', return_value=None):
+            options = OptionHandler().find_instruments('FAKE10P12-21')
+        self.assertEqual(option.id, options['FAKE10P12-21'].id)
+
+    def test_chain_errors_fall_back_to_search(self):
+        option = mock_option_workflow('FAKE11P12-21')
+        with patch.object(option_chain_index, 'chain', side_effect=ApiUnauthorizedException("Not accepted")):
+            options = OptionHandler().find_instruments('FAKE11P12-21')
+        self.assertEqual(option.id, options['FAKE11P12-21'].id)
+
+class StockBatchSearchTestCase(TestCase):
+
+    def setUp(self):
+        ApiResource.enable_mock = True
+
+    def test_stocks_resolved_in_batch(self):
+        symbols = ['BATCHA', 'BATCHB', 'BATCHC']
+        stocks = [mock_stock(s) for s in symbols]
+        for stock in stocks:
+            Cache.delete(Stock.search_url(symbol=stock.symbol))
+        # No quote for the last symbol, which is searched for separately
+        Stock.Quote.mock_search([mock_stock_quote(s) for s in stocks[:2]], symbols=symbols)
+        Stock.mock_search(stocks[:2], ids=[s.id for s in stocks[:2]])
+
+        with patch.object(Stock, 'search', wraps=Stock.search) as search:
+            found = StockHandler().find_instruments(*symbols)
+        for stock in stocks:
+            self.assertEqual(stock.id, found[stock.symbol].id)
+        searched_symbols = [call.kwargs['symbol'] for call in search.call_args_list if 'symbol' in call.kwargs]
+        self.assertEqual(['BATCHC'], searched_symbols)
+
+class ChunkedSearchTestCase(TestCase):
+
+    def setUp(self):
+        ApiResource.enable_mock = True
+        self.stocks = [mock_stock('CHUNK' + letter) for letter in 'ABCDEFGHIJ']
+        self.quotes = {s.url: mock_stock_quote(s) for s in self.stocks}
+        # Long enough for three instrument URLs at a time
+        self.max_length = len(Stock.Quote.search_url(instruments=sorted(self.quotes)[:3]))
+
+    def test_long_searches_are_chunked(self):
+        urls = set(self.quotes)
+        results, requested = self.search(urls)
+        self.assertEqual(sorted(urls), sorted(q.instrument for q in results))
+        self.assertGreater(len(requested), 1)
+        for request_url in requested:
+            self.assertLessEqual(len(request_url), self.max_length)
+
+    def test_chunks_are_shared_by_similar_searches(self):
+        urls = sorted(self.quotes)
+        _, requested = self.search(urls[:-1])
+        _, requested_with_one_more = self.search(urls)
+        # Only the chunk the added URL falls into changes
+        self.assertGreaterEqual(len(requested & requested_with_one_more), len(requested) - 1)
+        self.assertTrue(requested & requested_with_one_more)
+
+    def test_short_searches_are_not_chunked(self):
+        stock = self.stocks[0]
+        _, requested = self.search([stock.url])
+        self.assertEqual({Stock.Quote.search_url(instruments=[stock.url])}, requested)
+
+    def search(self, urls):
+        requested = set()
+        def request(resource_url, **params):
+            requested.add(Stock.Quote.search_url(**params))
+            return {'results': [self.quotes[url].raw_data() for url in params['instruments']]}
+        with patch.object(Stock.Quote, 'max_url_length', self.max_length), patch.object(Stock.Quote, 'request', side_effect=request):
+            results = Stock.Quote.search(instruments=urls)
+        return results, requested
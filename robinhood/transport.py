@@ -0,0 +1,89 @@
+"""Managed HTTP transport for Robinhood API calls.
+
+Holds a pooled, keep-alive `requests.Session` for the current process so that
+repeated calls to Robinhood reuse TCP/TLS connections instead of performing a
+new handshake for each request.
+
+Sessions are never shared across processes. When a multi-process runner such as
+uwsgi forks a worker, the connections inherited from the parent are discarded
+and a fresh session is built the first time the worker makes a request.
+"""
+import os
+import logging
+from threading import Lock
+
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+
+logger = logging.getLogger('stockbot')
+
+class Transport():
+    # Number of per-host connection pools kept by the session
+    DEFAULT_POOL_CONNECTIONS = 4
+    # Maximum number of open connections kept to a single host
+    DEFAULT_POOL_MAXSIZE = 16
+    # Block when all connections to a host are in use, rather than opening extra unpooled connections
+    DEFAULT_POOL_BLOCK = True
+    # Timeouts in seconds for establishing a connection and for reading a response
+    DEFAULT_CONNECT_TIMEOUT = 3.05
+    DEFAULT_READ_TIMEOUT = 15
+
+    def __init__(self):
+        self.session = None
+        self.pid = None
+        self.lock = Lock()
+
+    def get(self, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout())
+        return self.current_session().get(url, **kwargs)
+
+    def current_session(self) -> requests.Session:
+        # Rebuild the session if we are in a forked child process
+        if self.session is None or self.pid != os.getpid():
+            with self.lock:
+                if self.session is None or self.pid != os.getpid():
+                    self.session = self.build_session()
+                    self.pid = os.getpid()
+        return self.session
+
+    def build_session(self) -> requests.Session:
+        logger.info("Opening Robinhood HTTP session for process {}".format(os.getpid()))
+        adapter = HTTPAdapter(
+            pool_connections=Transport.setting('ROBINHOOD_POOL_CONNECTIONS', self.DEFAULT_POOL_CONNECTIONS),
+            pool_maxsize=Transport.setting('ROBINHOOD_POOL_MAXSIZE', self.DEFAULT_POOL_MAXSIZE),
+            pool_block=Transport.setting('ROBINHOOD_POOL_BLOCK', self.DEFAULT_POOL_BLOCK)
+        )
+        session = requests.Session()
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+    def timeout(self):
+        return (
+            Transport.setting('ROBINHOOD_CONNECT_TIMEOUT', self.DEFAULT_CONNECT_TIMEOUT),
+            Transport.setting('ROBINHOOD_READ_TIMEOUT', self.DEFAULT_READ_TIMEOUT)
+        )
+
+    def reset(self):
+        """Discards the current session without closing it.
+        Used after a fork, where the parent process still owns the open sockets."""
+        self.session = None
+        self.pid = None
+        self.lock = Lock()
+
+    def close(self):
+        with self.lock:
+            if self.session is not None and self.pid == os.getpid():
+                self.session.close()
+            self.session = None
+            self.pid = None
+
+    @staticmethod
+    def setting(name, default):
+        return getattr(settings, name, default)
+
+transport = Transport()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=transport.reset)